@@ -1,5 +1,5 @@
 import argparse
-from analytics.token_holders import top_holders_sqlite
+from analytics.token_holders import get_conn, top_holders_sqlite
 
 def main():
     p = argparse.ArgumentParser(description="Token holders analytics (SQLite)")
@@ -9,7 +9,7 @@ def main():
     p.add_argument("--as-of", type=int, default=None, help="As-of block number")
     args = p.parse_args()
 
-    rows = top_holders_sqlite(args.db, args.contract, n=args.top, as_of_block=args.as_of)
+    rows = top_holders_sqlite(get_conn(args.db), args.contract, n=args.top, as_of_block=args.as_of)
     for i, r in enumerate(rows, 1):
         print(f"{i:02d}. {r['address']}  {r['balance']}")
 
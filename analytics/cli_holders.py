@@ -1,9 +1,7 @@
 # analytics/cli_holders.py
 import argparse
-from analytics.holders import (
-    holder_balances_sqlite, holder_deltas_sqlite,
-    top_gainers_sqlite, top_spenders_sqlite, distribution_metrics_sqlite
-)
+from analytics.holders import analyze_contract
+from analytics.token_holders import get_conn
 
 def main():
     p = argparse.ArgumentParser(description="Token holder analytics (SQLite)")
@@ -14,22 +12,27 @@ def main():
     p.add_argument("--window-end", type=int, default=None, help="End block (inclusive)")
     p.add_argument("--top", type=int, default=5, help="Top N for gainers/spenders")
     args = p.parse_args()
+    con = get_conn(args.db)
 
-    bals = holder_balances_sqlite(args.db, args.contract, args.as_of)
-    print(f"Balances (as-of {args.as_of}): {len(bals)} holders")
-    for i, r in enumerate(bals[:args.top], 1):
+    window = None
+    if args.window_start is not None and args.window_end is not None:
+        window = (args.window_start, args.window_end)
+    report = analyze_contract(con, args.contract, args.as_of, window, n=args.top)
+
+    print(f"Balances (as-of {args.as_of}): {report['n_holders']} holders")
+    for i, r in enumerate(report["balances"], 1):
         print(f"{i:02d}. {r['address']}  {r['balance']}")
 
-    if args.window_start is not None and args.window_end is not None:
+    if window is not None:
         print(f"\nWindow: ({args.window_start}, {args.window_end}]")
         print("Top gainers:")
-        for r in top_gainers_sqlite(args.db, args.contract, args.top, args.window_start, args.window_end):
+        for r in report["gainers"]:
             print(f" + {r['address']}  {r['delta']}")
         print("Top spenders:")
-        for r in top_spenders_sqlite(args.db, args.contract, args.top, args.window_start, args.window_end):
+        for r in report["spenders"]:
             print(f" - {r['address']}  {r['delta']}")
 
-    m = distribution_metrics_sqlite(args.db, args.contract, args.as_of)
+    m = report["metrics"]
     print(f"\nDistribution metrics: Gini={m['gini']:.4f}  HHI={m['hhi']:.4f}")
 
 if __name__ == "__main__":
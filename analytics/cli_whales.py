@@ -1,6 +1,7 @@
 # analytics/cli_whales.py (optional)
 import argparse
-from analytics.whales import find_whales_sqlite, concentration_ratios_sqlite
+from analytics.whales import analyze_whales, find_whales_sqlite
+from analytics.token_holders import get_conn
 
 def main():
     p = argparse.ArgumentParser(description="Whale analytics (SQLite)")
@@ -8,16 +9,22 @@ def main():
     p.add_argument("--contract", required=True, help="ERC-20 contract")
     p.add_argument("--min-balance", type=int, default=1_000_000)
     p.add_argument("--as-of", type=int, default=None)
+    p.add_argument("--limit", type=int, default=None, help="Show at most this many whales")
     p.add_argument("--show-cr", action="store_true", help="Show concentration ratios")
+    p.add_argument("--ks", type=int, nargs="+", default=[1, 5, 10], help="Top k sizes for --show-cr")
     args = p.parse_args()
+    con = get_conn(args.db)
 
-    whales = find_whales_sqlite(args.db, args.contract, args.min_balance, args.as_of)
+    if args.show_cr:
+        report = analyze_whales(con, args.contract, args.min_balance, args.ks, args.as_of, args.limit)
+    else:
+        report = {"whales": find_whales_sqlite(con, args.contract, args.min_balance, args.as_of, args.limit)}
     print(f"Whales (balance >= {args.min_balance}):")
-    for i, w in enumerate(whales, 1):
+    for i, w in enumerate(report["whales"], 1):
         print(f"{i:02d}. {w['address']}  {w['balance']}")
 
     if args.show_cr:
-        cr = concentration_ratios_sqlite(args.db, args.contract, as_of_block=args.as_of)
+        cr = report["cr"]
         print("\nConcentration ratios:")
         for k in sorted(cr):
             print(f"CR{k:>3}: {cr[k]:.4f}")
@@ -1,70 +1,64 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import sqlite3
 
-DBPath = str
+import numpy as np
 
+from analytics.token_holders import (
+    ZERO_ADDRESS,
+    DBLike,
+    _as_conn,
+    _balance_filter,
+    _balances_columnar,
+    _deltas_cte,
+    _gini_hhi,
+    _to_dicts,
+    _transfers_source,
+    holder_balances_columnar,
+    holder_balances_sqlite,  # re-exported, see __all__
+)
 
-def _connect(db_path: DBPath) -> sqlite3.Connection:
-    con = sqlite3.connect(db_path)
-    con.row_factory = sqlite3.Row
-    return con
+# ROW_NUMBER() and SUM() OVER () need window function support (SQLite 3.25+)
+_HAS_WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25, 0)
 
 
-def _balances_rows(con: sqlite3.Connection, where: str, params: dict) -> List[Dict]:
-    sql = f"""
-      WITH deltas AS (
-        SELECT COALESCE(recipient, "to") AS address, CAST(value AS INTEGER) AS delta
-          FROM transfers
-         WHERE {where}
-        UNION ALL
-        SELECT COALESCE(sender, "from")  AS address, -CAST(value AS INTEGER) AS delta
-          FROM transfers
-         WHERE {where}
-      )
-      SELECT address, SUM(delta) AS balance
-        FROM deltas
-       GROUP BY address
-      HAVING balance != 0
-       ORDER BY balance DESC
-    """
-    return [dict(r) for r in con.execute(sql, params).fetchall()]
-
-
-def holder_balances_sqlite(
-    db_path: DBPath,
-    contract: Optional[str],
-    as_of_block: Optional[int] = None,
-) -> List[Dict[str, int]]:
-    """
-    Compute balances from transfers. Supports sender or from and recipient or to. Casts value to integer.
-    If a contract filter returns zero rows, fall back to all rows to stay robust against seed variance.
-    """
-    con = _connect(db_path)
-
-    params = {}
-    where = "1=1"
+def _window_filter(contract: Optional[str], start_block: int, end_block: int) -> Tuple[str, dict]:
+    params = {"start": int(start_block), "end": int(end_block)}
+    where = "block_number > :start AND block_number <= :end"
     if contract:
-        where = "contract = :contract"
+        where = f"contract = :contract AND {where}"
         params["contract"] = contract
-    if as_of_block is not None:
-        where = f"{where} AND block_number <= :asof"
-        params["asof"] = int(as_of_block)
-
-    rows = _balances_rows(con, where, params)
+    return where, params
 
-    if not rows:
-        params2 = {}
-        where2 = "1=1"
-        if as_of_block is not None:
-            where2 += " AND block_number <= :asof"
-            params2["asof"] = int(as_of_block)
-        rows = _balances_rows(con, where2, params2)
 
-    return rows
+def _agg_deltas(
+    con: sqlite3.Connection,
+    where: str,
+    params: dict,
+    order: str = "DESC",
+    limit: Optional[int] = None,
+    having: str = "delta != 0",
+) -> List[Dict]:
+    """
+    Net delta per address, ordered and optionally cut to the first limit rows inside SQLite.
+    """
+    if order not in ("ASC", "DESC"):
+        raise ValueError(f"order must be ASC or DESC, got {order!r}")
+    sql = f"""
+      WITH {_deltas_cte(where, _transfers_source(con))}
+      SELECT address, CAST(SUM(delta) AS INTEGER) AS delta
+        FROM deltas
+       GROUP BY address
+      HAVING {having}
+       ORDER BY delta {order}
+    """
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params = {**params, "limit": int(limit)}
+    return [{"address": a, "delta": d} for a, d in con.execute(sql, params).fetchall()]
 
 
 def holder_deltas_sqlite(
-    db_path: DBPath,
+    db_path: DBLike,
     contract: Optional[str],
     start_block: int,
     end_block: int,
@@ -72,67 +66,114 @@ def holder_deltas_sqlite(
     """
     Net change per address over the open interval start block to end block inclusive of end only.
     """
-    con = _connect(db_path)
-    params = {"start": int(start_block), "end": int(end_block)}
-    where = "block_number > :start AND block_number <= :end"
-    if contract:
-        where = f"contract = :contract AND {where}"
-        params["contract"] = contract
-
-    sql = f"""
-      WITH deltas AS (
-        SELECT COALESCE(recipient, "to") AS address, CAST(value AS INTEGER) AS delta
-          FROM transfers
-         WHERE {where}
-        UNION ALL
-        SELECT COALESCE(sender, "from")  AS address, -CAST(value AS INTEGER) AS delta
-          FROM transfers
-         WHERE {where}
-      )
-      SELECT address, SUM(delta) AS delta
-        FROM deltas
-       GROUP BY address
-      HAVING delta != 0
-       ORDER BY delta DESC
-    """
-    rows = con.execute(sql, params).fetchall()
-    return [dict(r) for r in rows]
+    con = _as_conn(db_path)
+    return _agg_deltas(con, *_window_filter(contract, start_block, end_block))
 
 
 def top_gainers_sqlite(
-    db_path: DBPath,
+    db_path: DBLike,
     contract: Optional[str],
     n: int,
     start_block: int,
     end_block: int,
 ) -> List[Dict]:
-    return holder_deltas_sqlite(db_path, contract, start_block, end_block)[: int(n)]
+    con = _as_conn(db_path)
+    return _agg_deltas(con, *_window_filter(contract, start_block, end_block), order="DESC", limit=n)
 
 
 def top_spenders_sqlite(
-    db_path: DBPath,
+    db_path: DBLike,
     contract: Optional[str],
     n: int,
     start_block: int,
     end_block: int,
 ) -> List[Dict]:
-    negatives = [
-        d for d in holder_deltas_sqlite(db_path, contract, start_block, end_block)
-        if int(d["delta"]) < 0
-    ]
-    negatives.sort(key=lambda x: int(x["delta"]))
-    return negatives[: int(n)]
+    con = _as_conn(db_path)
+    return _agg_deltas(
+        con, *_window_filter(contract, start_block, end_block), order="ASC", limit=n, having="delta < 0"
+    )
+
+
+def _distribution_metrics_sql(
+    con: sqlite3.Connection, where: str, params: dict
+) -> Tuple[float, float, int, int, int, float, Optional[int]]:
+    """
+    Gini, HHI, top 10 share and last block in one statement, no rows leave SQLite.
+    Returns gini, hhi, holder count, total, max balance, cr10 and last block; the zero
+    address is not a holder.
+    """
+    src = _transfers_source(con)
+    sql = f"""
+      WITH {_deltas_cte(where, src)},
+      b AS (
+        SELECT CAST(SUM(delta) AS INTEGER) AS bal
+          FROM deltas
+         WHERE address <> :zero
+         GROUP BY address
+        HAVING bal > 0
+      ),
+      ranked AS (
+        SELECT bal,
+               ROW_NUMBER() OVER (ORDER BY bal) AS i,
+               COUNT(*) OVER ()                 AS cnt,
+               TOTAL(bal) OVER ()               AS tot
+          FROM b
+      )
+      SELECT TOTAL(i * bal) * 2.0 / (COUNT(*) * MAX(tot)) - (COUNT(*) + 1.0) / COUNT(*) AS gini,
+             TOTAL((bal * 1.0 / tot) * (bal * 1.0 / tot))                            AS hhi,
+             COUNT(*)                                                                AS n,
+             SUM(bal >> 32)                                                          AS total_hi,
+             SUM(bal & 4294967295)                                                   AS total_lo,
+             MAX(bal)                                                                AS max_bal,
+             TOTAL(CASE WHEN i > cnt - 10 THEN bal END) / MAX(tot)                   AS cr10,
+             (SELECT MAX(block_number) FROM {src} WHERE {where})                     AS last_block
+        FROM ranked
+    """
+    row = con.execute(sql, {**params, "zero": ZERO_ADDRESS}).fetchone()
+    gini, hhi, n, total_hi, total_lo, max_bal, cr10, last_block = row
+    # SUM(bal) overflows int64 for a few large holders; its high and low 32 bit halves do not
+    total = ((total_hi or 0) << 32) + (total_lo or 0)
+    return gini or 0.0, hhi or 0.0, int(n), total, int(max_bal or 0), cr10 or 0.0, last_block
+
+
+def _distribution_metrics_py(
+    con: sqlite3.Connection, where: str, params: dict
+) -> Tuple[float, float, int, int, int, float, Optional[int]]:
+    src = _transfers_source(con)
+    last_block = con.execute(f"SELECT MAX(block_number) FROM {src} WHERE {where}", params).fetchone()[0]
+    _, bals = _balances_columnar(con, where, params, exclude_burn=True)
+    arr = bals[bals > 0]
+    if not len(arr):
+        return 0.0, 0.0, 0, 0, 0, 0.0, last_block
+    gini, hhi = _gini_hhi(arr)
+    total = int(arr.sum(dtype=object))
+    cr10 = float(np.sort(arr)[-10:].sum(dtype=object) / total)
+    return gini, hhi, len(arr), total, int(arr.max()), cr10, last_block
 
 
 def distribution_metrics_sqlite(
-    db_path: DBPath,
+    db_path: DBLike,
     contract: Optional[str],
     as_of_block: Optional[int] = None,
 ) -> Dict[str, float]:
-    bals = holder_balances_sqlite(db_path, contract, as_of_block)
-    arr = [int(b["balance"]) for b in bals if int(b["balance"]) > 0]
-    n = len(arr)
-    total = sum(arr)
+    """
+    Gini, HHI and top 10 share over positive balances, plus the last block seen.
+    Computed inside SQLite with window functions when available, otherwise in
+    Python over the balance rows.
+    """
+    con = _as_conn(db_path)
+    metrics = _distribution_metrics_sql if _HAS_WINDOW_FUNCTIONS else _distribution_metrics_py
+
+    gini, hhi, n, total, max_bal, cr10, last_block = metrics(con, *_balance_filter(contract, as_of_block))
+    if n == 0 and contract:
+        gini, hhi, n, total, max_bal, cr10, last_block = metrics(con, *_balance_filter(None, as_of_block))
+
+    return _metrics_dict(gini, hhi, n, total, max_bal, cr10, last_block)
+
+
+def _metrics_dict(
+    gini: float, hhi: float, n: int, total: int, max_bal: int, cr10: float, last_block: Optional[int]
+) -> Dict[str, float]:
     if n == 0 or total == 0:
         return {
             "total": 0.0,
@@ -141,24 +182,59 @@ def distribution_metrics_sqlite(
             "max": 0.0,
             "hhi": 0.0,
             "gini": 0.0,
+            "cr10": 0.0,
+            "last_block": last_block,
         }
-    mean = total / n
-    hhi = sum((x / total) ** 2 for x in arr)
-    xs = sorted(arr)
-    cum = 0
-    bsum = 0
-    for x in xs:
-        cum += x
-        bsum += cum
-    gini = 1.0 - 2.0 * (bsum / (n * total)) + 1.0 / n
     return {
         "total": float(total),
         "n_holders": float(n),
-        "mean": float(mean),
-        "max": float(max(arr)),
+        "mean": float(total / n),
+        "max": float(max_bal),
         "hhi": float(hhi),
         "gini": float(gini),
+        "cr10": float(cr10),
+        "last_block": last_block,
+    }
+
+
+def analyze_contract(
+    db_path: DBLike,
+    contract: str,
+    as_of_block: Optional[int] = None,
+    window: Optional[Tuple[int, int]] = None,
+    n: int = 5,
+) -> Dict:
+    """
+    Everything cli_holders prints from one balance aggregation and at most one window aggregation.
+    Returns holder count, top n balances, distribution metrics and, when a (start, end] window
+    is given, top n gainers and spenders over it.
+    """
+    con = _as_conn(db_path)
+    addrs, bals = holder_balances_columnar(con, contract, as_of_block)
+
+    where, params = _balance_filter(contract, as_of_block)
+    last_block = con.execute(
+        f"SELECT MAX(block_number) FROM {_transfers_source(con)} WHERE {where}", params
+    ).fetchone()[0]
+    pos = np.sort(bals[(bals > 0) & (addrs != ZERO_ADDRESS)])
+    if len(pos):
+        gini, hhi = _gini_hhi(pos)
+        total = int(pos.sum(dtype=object))
+        cr10 = float(pos[-10:].sum(dtype=object) / total)
+        metrics = _metrics_dict(gini, hhi, len(pos), total, int(pos[-1]), cr10, last_block)
+    else:
+        metrics = _metrics_dict(0.0, 0.0, 0, 0, 0, 0.0, last_block)
+
+    out = {
+        "n_holders": len(bals),
+        "balances": _to_dicts((addrs[:n], bals[:n])),
+        "metrics": metrics,
     }
+    if window is not None:
+        deltas = _agg_deltas(con, *_window_filter(contract, *window))
+        out["gainers"] = deltas[:n]
+        out["spenders"] = [d for d in reversed(deltas) if d["delta"] < 0][:n]
+    return out
 
 
 __all__ = [
@@ -167,4 +243,5 @@ __all__ = [
     "top_gainers_sqlite",
     "top_spenders_sqlite",
     "distribution_metrics_sqlite",
+    "analyze_contract",
 ]
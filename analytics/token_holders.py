@@ -1,37 +1,715 @@
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import os
 import sqlite3
 
+import numpy as np
+
+from common.utils import SQLITE_STATEMENT_CACHE
+
+try:
+    # optional; numba may not be installed
+    from numba import njit, prange
+except Exception:  # pragma: no cover
+    njit = None
+
 DBPath = str
+DBLike = Union[DBPath, sqlite3.Connection]
+# (addresses, balances) column pair, largest balance first
+Columns = Tuple[np.ndarray, np.ndarray]
+
+# holder count above which the parallel numba kernel is used
+_PARALLEL_MIN_HOLDERS = 1_000_000
+# headroom below 2**63 for int64 running sums
+_INT64_SAFE = float(2**62)
+# rows per fetchmany() when converting balance results to arrays
+_FETCH_CHUNK = 65536
+# holder_balances_columnar results, (db path, call args) -> (file stamp, columns)
+_RESULT_CACHE: "OrderedDict[tuple, Tuple[Tuple[int, ...], Columns]]" = OrderedDict()
+_RESULT_CACHE_SIZE = 64
+# _conn_state entries, id(connection) -> (connection, memo)
+_CONN_STATE: "OrderedDict[int, Tuple[sqlite3.Connection, dict]]" = OrderedDict()
+_CONN_STATE_SIZE = 64
+# as_of snapshots are persisted on multiples of this many blocks; blocks past the
+# checkpoint are summed on read, so the cache holds one snapshot per window
+_SNAPSHOT_EVERY = 1000
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS balances_cache(
+  contract    TEXT    NOT NULL,
+  as_of_block INTEGER NOT NULL,
+  address     TEXT    NOT NULL,
+  balance     INTEGER NOT NULL,
+  PRIMARY KEY(contract, as_of_block, address)
+);
+
+-- top-n reads of a checkpoint walk this backwards, same as idx_balances_current_balance
+CREATE INDEX IF NOT EXISTS idx_balances_cache_balance ON balances_cache(contract, as_of_block, balance);
+
+-- transfers rowid high water mark each snapshot was built from
+CREATE TABLE IF NOT EXISTS cache_meta(
+  contract    TEXT    NOT NULL,
+  as_of_block INTEGER NOT NULL,
+  max_rowid   INTEGER NOT NULL,
+  PRIMARY KEY(contract, as_of_block)
+);
+
+-- live balances, advanced incrementally from the transfers rowid high water mark
+CREATE TABLE IF NOT EXISTS balances_current(
+  contract   TEXT    NOT NULL,
+  address    TEXT    NOT NULL,
+  balance    INTEGER NOT NULL,
+  last_block INTEGER NOT NULL,
+  PRIMARY KEY(contract, address)
+);
 
-def _connect(db: DBPath) -> sqlite3.Connection:
-    con = sqlite3.connect(db)
+-- top-k and min balance lookups walk this backwards instead of sorting every holder
+CREATE INDEX IF NOT EXISTS idx_balances_current_balance ON balances_current(contract, balance);
+
+-- rowid high water mark balances_current was folded up to, per contract, and the transfers
+-- generation (see storage.sqlite_backend) it was folded at; replaces balances_current_meta
+DROP TABLE IF EXISTS balances_current_meta;
+CREATE TABLE IF NOT EXISTS balances_current_watermark(
+  contract   TEXT PRIMARY KEY,
+  max_rowid  INTEGER NOT NULL,
+  generation INTEGER
+);
+"""
+
+# per connection settings only; the journal mode is stored in the file, so it is left to the
+# writer (storage.sqlite_backend.SQLiteStorage.setup)
+_READ_PRAGMAS = """
+PRAGMA synchronous=NORMAL;
+PRAGMA mmap_size=1073741824;
+PRAGMA cache_size=-262144;
+PRAGMA temp_store=MEMORY;
+"""
+
+@lru_cache(maxsize=8)
+def get_conn(db_path: DBPath) -> sqlite3.Connection:
+    """
+    Shared connection per DB path with mmap and a 256 MB page cache applied once.
+    Call get_conn.cache_clear() if the file is replaced underneath.
+    """
+    con = sqlite3.connect(db_path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
     con.row_factory = sqlite3.Row
+    con.executescript(_READ_PRAGMAS)
     return con
 
-def balances_as_of_sqlite(db: DBPath, contract: str, as_of_block: Optional[int] = None) -> List[Dict]:
+def _as_conn(db: DBLike) -> sqlite3.Connection:
+    return db if isinstance(db, sqlite3.Connection) else get_conn(db)
+
+# canonical transfers columns and the legacy spellings folded into them
+_LEGACY_COLUMNS = {
+    "sender": ("sender", "from"),
+    "recipient": ("recipient", "to"),
+    "block_number": ("block_number", "blockNumber"),
+}
+
+def _conn_state(con: sqlite3.Connection) -> dict:
     """
-    Mirror of holders.holder_balances_sqlite kept for backward calls
+    Per connection memo for one time setup. sqlite3 connections take neither attributes nor
+    weak references, so entries hold the connection itself (no id reuse) and age out LRU.
     """
-    con = _connect(db)
-    where = "1=1"
+    key = id(con)
+    hit = _CONN_STATE.get(key)
+    if hit is not None and hit[0] is con:
+        _CONN_STATE.move_to_end(key)
+        return hit[1]
+    state: dict = {}
+    _CONN_STATE[key] = (con, state)
+    if len(_CONN_STATE) > _CONN_STATE_SIZE:
+        _CONN_STATE.popitem(last=False)
+    return state
+
+def _ensure_cache_schema(con: sqlite3.Connection) -> None:
+    """
+    balances_cache / balances_current tables, created once per connection rather than
+    re-running the DDL script (and its implicit COMMIT) on every read.
+    """
+    state = _conn_state(con)
+    if not state.get("cache_schema"):
+        con.executescript(_CACHE_SCHEMA)
+        state["cache_schema"] = True
+
+def _transfers_source(con: sqlite3.Connection) -> str:
+    """
+    Table or view exposing transfers as (contract, sender, recipient, value, block_number).
+    Tables written by SQLiteStorage are used as is. Older layouts with "from", "to" or
+    blockNumber get a temp view transfers_norm so every query sees one schema.
+    Resolved once per connection.
+    """
+    state = _conn_state(con)
+    src = state.get("transfers_source")
+    if src is None:
+        src = _resolve_transfers_source(con)
+        if src is not None:
+            state["transfers_source"] = src
+    return src or "transfers"
+
+def _resolve_transfers_source(con: sqlite3.Connection) -> Optional[str]:
+    cols = {r[1] for r in con.execute("PRAGMA table_info(transfers)").fetchall()}
+    if not cols:
+        # no transfers table yet; decide once it exists
+        return None
+    if all(name in cols for name in _LEGACY_COLUMNS):
+        return "transfers"
+    select = ["rowid AS rowid", "contract", "CAST(value AS INTEGER) AS value"]
+    for name, candidates in _LEGACY_COLUMNS.items():
+        present = [f'"{c}"' for c in candidates if c in cols]
+        expr = present[0] if len(present) == 1 else f"COALESCE({', '.join(present)})"
+        select.append(f"{expr} AS {name}")
+    con.execute(f"CREATE TEMP VIEW IF NOT EXISTS transfers_norm AS SELECT {', '.join(select)} FROM transfers")
+    return "transfers_norm"
+
+@lru_cache(maxsize=64)
+def _deltas_cte(where: str, src: str = "transfers") -> str:
+    """
+    Per address partial sums, one row per (side, address). Each branch is an index only
+    scan on the covering sender/recipient indexes and is grouped before the union, so the
+    outer GROUP BY sees distinct addresses rather than every transfer twice.
+    """
+    return f"""
+      deltas AS (
+        SELECT recipient AS address, SUM(value)  AS delta FROM {src} WHERE {where} GROUP BY recipient
+        UNION ALL
+        SELECT sender    AS address, -SUM(value) AS delta FROM {src} WHERE {where} GROUP BY sender
+      )"""
+
+def _balance_filter(contract: Optional[str], as_of_block: Optional[int]) -> Tuple[str, dict]:
     params = {}
+    where = "1=1"
+    if contract:
+        where = "contract = :contract"
+        params["contract"] = contract
     if as_of_block is not None:
-        where += " AND block_number <= :asof"
+        where = f"{where} AND block_number <= :asof"
         params["asof"] = int(as_of_block)
-    sql = f"""
-        WITH deltas AS (
-          SELECT recipient AS addr, value  AS delta FROM transfers WHERE {where}
-          UNION ALL
-          SELECT sender    AS addr, -value AS delta FROM transfers WHERE {where}
-        )
-        SELECT addr AS address, SUM(delta) AS balance
+    return where, params
+
+@lru_cache(maxsize=64)
+def _balances_sql(where: str, src: str) -> str:
+    return f"""
+      WITH {_deltas_cte(where, src)}
+      SELECT address, CAST(SUM(delta) AS INTEGER) AS balance
         FROM deltas
-        GROUP BY addr
-        HAVING balance != 0
-        ORDER BY balance DESC
+       GROUP BY address
+      HAVING balance != 0
+    """
+
+def _limit_clause(params: dict, n: Optional[int]) -> Tuple[str, dict]:
+    """
+    LIMIT :n suffix so SQLite keeps only a top-n heap instead of sorting every holder.
+    """
+    if n is None:
+        return "", params
+    return " LIMIT :n", {**params, "n": int(n)}
+
+ZERO_ADDRESS = "0x" + "0" * 40
+
+def _min_clause(params: dict, min_balance: Optional[int], exclude_burn: bool = False) -> Tuple[str, dict]:
+    """
+    AND balance >= :min_balance, and the zero address filter when exclude_burn is set,
+    so whale thresholds and the burn sink are dropped before rows leave SQLite.
+    """
+    cond = ""
+    if min_balance is not None:
+        cond += " AND balance >= :min_balance"
+        params = {**params, "min_balance": int(min_balance)}
+    if exclude_burn:
+        cond += " AND address <> :zero"
+        params = {**params, "zero": ZERO_ADDRESS}
+    return cond, params
+
+def _int_array(vals: Sequence[int]) -> np.ndarray:
+    """
+    int64 array of vals, float64 when a value does not fit.
+    """
+    try:
+        return np.fromiter(vals, dtype=np.int64)
+    except OverflowError:
+        return np.fromiter(vals, dtype=np.float64)
+
+def _fetch_columns(cur: sqlite3.Cursor) -> Columns:
+    """
+    (address, balance) rows from cur split into an object array and an integer array.
+    Rows are pulled _FETCH_CHUNK at a time so the full result never exists as Python tuples.
+    """
+    addr_parts, bal_parts = [], []
+    while True:
+        rows = cur.fetchmany(_FETCH_CHUNK)
+        if not rows:
+            break
+        addrs, bals = zip(*rows)
+        addr_parts.append(np.array(addrs, dtype=object))
+        bal_parts.append(_int_array(bals))
+    if not addr_parts:
+        return np.empty(0, dtype=object), np.empty(0, dtype=np.int64)
+    return np.concatenate(addr_parts), np.concatenate(bal_parts)
+
+def _to_dicts(cols: Columns) -> List[Dict]:
+    addrs, bals = cols
+    # tolist() already yields Python ints, no per row coercion needed
+    return [{"address": a, "balance": b} for a, b in zip(addrs.tolist(), bals.tolist())]
+
+def _select_balances(
+    con: sqlite3.Connection,
+    source: str,
+    params: dict,
+    n: Optional[int] = None,
+    min_balance: Optional[int] = None,
+    exclude_burn: bool = False,
+) -> Columns:
+    """
+    Non zero (address, balance) rows of the source subquery, largest first, with the
+    threshold, burn filter and limit applied in SQL.
+    """
+    return _fetch_columns(_tuple_cursor(con).execute(*_select_sql(source, params, n, min_balance, exclude_burn)))
+
+def _tuple_cursor(con: sqlite3.Connection) -> sqlite3.Cursor:
+    """
+    Cursor yielding plain tuples whatever the connection's row_factory; rows feeding
+    arrays never need a sqlite3.Row built per holder.
+    """
+    cur = con.cursor()
+    cur.row_factory = None
+    return cur
+
+def _select_sql(
+    source: str,
+    params: dict,
+    n: Optional[int] = None,
+    min_balance: Optional[int] = None,
+    exclude_burn: bool = False,
+) -> Tuple[str, dict]:
+    cond, params = _min_clause(params, min_balance, exclude_burn)
+    limit, params = _limit_clause(params, n)
+    return f"SELECT address, balance FROM ({source}) WHERE balance <> 0{cond} ORDER BY balance DESC{limit}", params
+
+def _balances_columnar(
+    con: sqlite3.Connection,
+    where: str,
+    params: dict,
+    n: Optional[int] = None,
+    min_balance: Optional[int] = None,
+    exclude_burn: bool = False,
+) -> Columns:
+    source = _balances_sql(where, _transfers_source(con))
+    return _select_balances(con, source, params, n, min_balance, exclude_burn)
+
+def _snapshot_stale(con: sqlite3.Connection, src: str, contract: str, as_of: int, max_rowid: int) -> bool:
+    """
+    True when transfers at or below as_of were appended after the snapshot's rowid high water mark.
+    """
+    return con.execute(
+        f"""
+        SELECT 1 FROM {src}
+        WHERE rowid > :rowid AND contract = :contract AND block_number <= :asof
+        LIMIT 1
+        """,
+        {"contract": contract, "asof": int(as_of), "rowid": max_rowid},
+    ).fetchone() is not None
+
+def _base_snapshot(con: sqlite3.Connection, src: str, contract: str, as_of: int) -> Optional[int]:
+    """
+    as_of_block of the latest cached snapshot below as_of that is still valid, if any.
+    """
+    row = con.execute(
+        """
+        SELECT as_of_block, max_rowid FROM cache_meta
+        WHERE contract = ? AND as_of_block < ?
+        ORDER BY as_of_block DESC LIMIT 1
+        """,
+        (contract, int(as_of)),
+    ).fetchone()
+    if row is None or _snapshot_stale(con, src, contract, row[0], row[1]):
+        return None
+    return int(row[0])
+
+@lru_cache(maxsize=64)
+def _rolled_sql(where: str, src: str) -> str:
+    """
+    (address, balance) from the balances_cache snapshot at :prev plus the transfers matching where.
     """
-    rows = con.execute(sql, params).fetchall()
-    return [dict(r) for r in rows]
+    return f"""
+    WITH {_deltas_cte(where, src)}
+    SELECT address, CAST(SUM(delta) AS INTEGER) AS balance
+      FROM (
+        SELECT address, balance AS delta FROM balances_cache
+         WHERE contract = :contract AND as_of_block = :prev
+        UNION ALL
+        SELECT address, delta FROM deltas
+      )
+     GROUP BY address
+    HAVING balance != 0
+    """
+
+def _ensure_snapshot(con: sqlite3.Connection, contract: str, as_of: int) -> None:
+    """
+    Persist balances for a fixed (contract, as_of) snapshot in balances_cache on first miss.
+    A snapshot is rebuilt when transfers at or below as_of were appended after it was taken.
+    New snapshots start from the nearest valid earlier one and only scan the blocks in between.
+    """
+    _ensure_cache_schema(con)
+    src = _transfers_source(con)
+    key = {"contract": contract, "asof": int(as_of)}
+    meta = con.execute(
+        "SELECT max_rowid FROM cache_meta WHERE contract = :contract AND as_of_block = :asof", key
+    ).fetchone()
+
+    if meta is None or _snapshot_stale(con, src, contract, as_of, meta[0]):
+        with con:
+            max_rowid = con.execute("SELECT COALESCE(MAX(rowid), 0) FROM transfers").fetchone()[0]
+            params = {**key, "rowid": max_rowid}
+            con.execute("DELETE FROM balances_cache WHERE contract = :contract AND as_of_block = :asof", key)
+            prev = _base_snapshot(con, src, contract, as_of)
+            if prev is None:
+                where = "contract = :contract AND block_number <= :asof AND rowid <= :rowid"
+                select = f"SELECT :contract, :asof, address, balance FROM ({_balances_sql(where, src)})"
+            else:
+                # roll the nearest valid earlier snapshot forward over (prev, as_of] only
+                params["prev"] = prev
+                where = "contract = :contract AND block_number > :prev AND block_number <= :asof AND rowid <= :rowid"
+                select = f"SELECT :contract, :asof, address, balance FROM ({_rolled_sql(where, src)})"
+            con.execute(f"INSERT INTO balances_cache(contract, as_of_block, address, balance) {select}", params)
+            con.execute(
+                "INSERT OR REPLACE INTO cache_meta(contract, as_of_block, max_rowid) VALUES(:contract, :asof, :rowid)",
+                params,
+            )
+
+def _refresh_balances_current(con: sqlite3.Connection, contract: str) -> None:
+    """
+    Fold transfers appended since the last refresh into balances_current, reading only the
+    rows past the watermark. Deletes and rewrites bump the transfers generation kept by
+    SQLiteStorage's triggers, and a moved generation rebuilds the contract from scratch;
+    files without those triggers are taken as append only. An unchanged watermark costs
+    two lookups and no write, and nothing is checked while neither PRAGMA data_version nor
+    this connection's total_changes moved since the last refresh.
+    """
+    _ensure_cache_schema(con)
+    src = _transfers_source(con)
+    state = _conn_state(con)
+    seen_key = ("balances_current", contract)
+    if state.get(seen_key) == _change_stamp(con):
+        return
+    params = {"contract": contract}
+    if _fold_mark(con, contract) != _transfers_mark(con):
+        with con:
+            if not con.in_transaction:
+                con.execute("BEGIN IMMEDIATE")
+            # re-read under the write lock, another writer may have folded meanwhile
+            folded = _fold_mark(con, contract)
+            max_rowid, generation = _transfers_mark(con)
+            last = folded[0] if folded is not None and folded[1] == generation else 0
+            if last == 0:
+                con.execute("DELETE FROM balances_current WHERE contract = :contract", params)
+            if max_rowid > last:
+                # +contract keeps the planner on the rowid range rather than the contract's index entries
+                con.execute(
+                    f"""
+                    WITH t AS (
+                      SELECT sender, recipient, value, block_number FROM {src}
+                      WHERE +contract = :contract AND rowid > :last AND rowid <= :rowid
+                    ),
+                    deltas AS (
+                      SELECT recipient AS addr, value  AS delta, block_number FROM t
+                      UNION ALL
+                      SELECT sender    AS addr, -value AS delta, block_number FROM t
+                    )
+                    INSERT INTO balances_current(contract, address, balance, last_block)
+                    SELECT :contract, addr, CAST(SUM(delta) AS INTEGER), MAX(block_number) FROM deltas WHERE true GROUP BY addr
+                    ON CONFLICT(contract, address) DO UPDATE SET
+                      balance    = balance + excluded.balance,
+                      last_block = MAX(last_block, excluded.last_block)
+                    """,
+                    {**params, "last": last, "rowid": max_rowid},
+                )
+            con.execute(
+                "INSERT OR REPLACE INTO balances_current_watermark(contract, max_rowid, generation)"
+                " VALUES(:contract, :rowid, :generation)",
+                {**params, "rowid": max_rowid, "generation": generation},
+            )
+    state[seen_key] = _change_stamp(con)
+
+def _fold_mark(con: sqlite3.Connection, contract: str) -> Optional[Tuple[int, Optional[int]]]:
+    """(max_rowid, generation) balances_current was last folded at for contract, or None."""
+    row = con.execute(
+        "SELECT max_rowid, generation FROM balances_current_watermark WHERE contract = ?", (contract,)
+    ).fetchone()
+    return (int(row[0]), row[1]) if row else None
+
+def _transfers_mark(con: sqlite3.Connection) -> Tuple[int, Optional[int]]:
+    """
+    (MAX(rowid), generation) of transfers; the generation is None on files whose
+    transfers table was not set up by SQLiteStorage.
+    """
+    max_rowid = con.execute("SELECT COALESCE(MAX(rowid), 0) FROM transfers").fetchone()[0]
+    try:
+        row = con.execute("SELECT generation FROM table_generations WHERE name = 'transfers'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    return int(max_rowid), (row[0] if row else None)
+
+def _change_stamp(con: sqlite3.Connection) -> Tuple[int, int]:
+    """
+    PRAGMA data_version moves when another connection commits to the file, total_changes
+    when this one writes; together they tell whether anything could have changed.
+    """
+    return con.execute("PRAGMA data_version").fetchone()[0], con.total_changes
+
+def _balances_source(
+    con: sqlite3.Connection, contract: Optional[str], as_of_block: Optional[int] = None
+) -> Tuple[str, dict]:
+    """
+    Subquery yielding (address, balance) for a contract, and its params.
+    Live balances come from balances_current, fixed as_of_block balances from the balances_cache
+    checkpoint at or below it plus the transfers since; without a contract the balances are
+    aggregated from transfers directly.
+    """
+    if not contract:
+        where, params = _balance_filter(None, as_of_block)
+        return _balances_sql(where, _transfers_source(con)), params
+    if as_of_block is None:
+        _refresh_balances_current(con, contract)
+        return "SELECT address, balance FROM balances_current WHERE contract = :contract", {"contract": contract}
+    as_of = int(as_of_block)
+    checkpoint = as_of - as_of % _SNAPSHOT_EVERY
+    _ensure_snapshot(con, contract, checkpoint)
+    if checkpoint == as_of:
+        return (
+            "SELECT address, balance FROM balances_cache WHERE contract = :contract AND as_of_block = :asof",
+            {"contract": contract, "asof": as_of},
+        )
+    where = "contract = :contract AND block_number > :prev AND block_number <= :asof"
+    return _rolled_sql(where, _transfers_source(con)), {"contract": contract, "prev": checkpoint, "asof": as_of}
+
+def holder_balances_columnar(
+    db: DBLike,
+    contract: Optional[str],
+    as_of_block: Optional[int] = None,
+    n: Optional[int] = None,
+    min_balance: Optional[int] = None,
+    exclude_burn: bool = False,
+) -> Columns:
+    """
+    Non zero balances per address computed from transfers as (addresses, balances) arrays,
+    largest first. n, min_balance and exclude_burn (drop the zero address) are applied in SQL.
+    Results are kept in a small LRU keyed by the call and reused until the database file or its
+    WAL changes; the returned arrays are read only.
+    If a contract filter returns zero rows, fall back to all rows to stay robust against seed variance,
+    with the same n, min_balance and exclude_burn; filters that drop every holder are not a miss.
+    """
+    con = _as_conn(db)
+    path = _db_file(con)
+    if not path:
+        return _holder_balances(con, contract, as_of_block, n, min_balance, exclude_burn)
+
+    key = (path, contract, as_of_block, n, min_balance, exclude_burn)
+    hit = _RESULT_CACHE.get(key)
+    if hit is not None and hit[0] == _db_stamp(con, path):
+        _RESULT_CACHE.move_to_end(key)
+        return hit[1]
+    cols = _holder_balances(con, contract, as_of_block, n, min_balance, exclude_burn)
+    for arr in cols:
+        arr.setflags(write=False)  # shared between callers
+    # stamp after the query so its own balances_current / balances_cache writes do not count
+    _RESULT_CACHE[key] = (_db_stamp(con, path), cols)
+    _RESULT_CACHE.move_to_end(key)
+    while len(_RESULT_CACHE) > _RESULT_CACHE_SIZE:
+        _RESULT_CACHE.popitem(last=False)
+    return cols
+
+def _holder_balances(
+    con: sqlite3.Connection,
+    contract: Optional[str],
+    as_of_block: Optional[int],
+    n: Optional[int],
+    min_balance: Optional[int],
+    exclude_burn: bool,
+) -> Columns:
+    source, params = _balances_source(con, contract, as_of_block)
+    cols = _select_balances(con, source, params, n, min_balance, exclude_burn)
+    if not len(cols[0]) and contract:
+        # a miss is a contract without balances, not one whose holders the filters dropped
+        filtered = min_balance is not None or exclude_burn
+        if not filtered or not len(_select_balances(con, source, params, n=1)[0]):
+            cols = _balances_columnar(con, *_balance_filter(None, as_of_block), n, min_balance, exclude_burn)
+    return cols
+
+def _db_file(con: sqlite3.Connection) -> str:
+    """
+    File backing the main schema of con, empty for in memory databases.
+    """
+    return con.execute("PRAGMA database_list").fetchone()[2] or ""
+
+def _db_stamp(con: sqlite3.Connection, path: str) -> Tuple[int, ...]:
+    """
+    mtime_ns and size of the database and its WAL (commits in WAL mode only touch the latter),
+    plus the transfers rowid high water mark, which still moves when two commits share an mtime tick.
+    """
+    stamp = []
+    for p in (path, path + "-wal"):
+        try:
+            st = os.stat(p)
+            stamp += [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            stamp += [0, 0]
+    stamp.append(con.execute("SELECT COALESCE(MAX(rowid), 0) FROM transfers").fetchone()[0])
+    return tuple(stamp)
+
+def holder_balances_sqlite(
+    db: DBLike,
+    contract: Optional[str],
+    as_of_block: Optional[int] = None,
+    n: Optional[int] = None,
+    as_dataframe: bool = False,
+):
+    """
+    holder_balances_columnar as a list of {"address", "balance"} dicts.
+    as_dataframe=True returns a pandas DataFrame instead; pandas is imported only then,
+    so CLI callers never pay its import cost.
+    """
+    addrs, bals = holder_balances_columnar(db, contract, as_of_block, n)
+    if as_dataframe:
+        from pandas import DataFrame
+
+        return DataFrame({"address": addrs, "balance": bals})
+    return _to_dicts((addrs, bals))
+
+def iter_balances_as_of_sqlite(
+    db: DBLike,
+    contract: Optional[str],
+    as_of_block: Optional[int] = None,
+    min_balance: Optional[int] = None,
+    exclude_burn: bool = False,
+) -> Iterator[Tuple[str, int]]:
+    """
+    (address, balance) tuples, largest first, yielded straight off the cursor so nothing is
+    materialized. No fallback to other contracts. Drain the generator or close() it to release
+    the statement.
+    """
+    con = _as_conn(db)
+    source, params = _balances_source(con, contract, as_of_block)
+    cur = con.execute(*_select_sql(source, params, min_balance=min_balance, exclude_burn=exclude_burn))
+    try:
+        for address, balance in cur:
+            yield address, balance
+    finally:
+        cur.close()
+
+def iter_holder_balances(
+    db: DBLike,
+    contract: Optional[str],
+    as_of_block: Optional[int] = None,
+    min_balance: Optional[int] = None,
+) -> Iterator[Dict[str, int]]:
+    """
+    iter_balances_as_of_sqlite as {"address", "balance"} dicts.
+    """
+    rows = iter_balances_as_of_sqlite(db, contract, as_of_block, min_balance)
+    try:
+        for address, balance in rows:
+            yield {"address": address, "balance": balance}
+    finally:
+        rows.close()
+
+def balances_as_of_sqlite(
+    db: DBLike, contract: str, as_of_block: Optional[int] = None, n: Optional[int] = None
+) -> List[Dict]:
+    """
+    Alias of holder_balances_sqlite kept for backward calls
+    """
+    return holder_balances_sqlite(db, contract, as_of_block, n)
+
+def top_holders_sqlite(db: DBLike, contract: str, n: int = 10, as_of_block: Optional[int] = None) -> List[Dict]:
+    return balances_as_of_sqlite(db, contract, as_of_block, n=n)
+
+
+def _sorted_positive(vals: Sequence[int]) -> np.ndarray:
+    """
+    Positive entries of vals sorted ascending.
+    Kept as int64 so wei amounts stay exact, values past 2**63 fall back to float64.
+    """
+    x = _int_array(vals)
+    x = x[x > 0]
+    x.sort()
+    return x
+
+
+def _gini_hhi_numpy(vals: Sequence[int]) -> Tuple[float, float]:
+    """
+    Gini and HHI over the positive entries of vals, vectorized.
+    """
+    x = _sorted_positive(vals)
+    n = x.size
+    if n == 0:
+        return 0.0, 0.0
+    total = float(x.sum(dtype=np.float64))
+    # rank weighted sum as one dot product with 1..n, no running sum array; exact in
+    # int64 while n * total fits, since sum(i * x_i) <= n * total
+    if x.dtype == np.int64 and total * n < _INT64_SAFE:
+        wsum = int(np.dot(np.arange(1, n + 1, dtype=np.int64), x))
+        gini = 2 * wsum / (n * int(x.sum())) - (n + 1) / n
+    else:
+        wsum = float(np.dot(np.arange(1, n + 1, dtype=np.float64), x.astype(np.float64, copy=False)))
+        gini = 2.0 * wsum / (n * total) - (n + 1) / n
+    shares = x / total
+    hhi = float(np.dot(shares, shares))
+    return float(max(0.0, min(1.0, gini))), hhi
+
+
+if njit is not None:
+
+    @njit(cache=True, fastmath=True)
+    def _gini_hhi_nb(x_sorted, total):
+        # one fused pass for both reductions
+        n = x_sorted.size
+        cum = 0.0
+        sq = 0.0
+        for i in range(n):
+            xi = float(x_sorted[i])
+            cum += (i + 1) * xi
+            sq += xi * xi
+        return 2.0 * cum / (n * total) - (n + 1.0) / n, sq / (total * total)
+
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _gini_hhi_nb_parallel(x_sorted, total):
+        n = x_sorted.size
+        cum = 0.0
+        sq = 0.0
+        for i in prange(n):
+            xi = float(x_sorted[i])
+            cum += (i + 1) * xi
+            sq += xi * xi
+        return 2.0 * cum / (n * total) - (n + 1.0) / n, sq / (total * total)
+
+
+def _gini_hhi(vals: Sequence[int]) -> Tuple[float, float]:
+    """
+    Gini and HHI over the positive entries of vals.
+    Uses a compiled numba kernel when numba is installed, NumPy otherwise.
+    """
+    if njit is None:
+        return _gini_hhi_numpy(vals)
+    x = _sorted_positive(vals)
+    n = x.size
+    if n == 0:
+        return 0.0, 0.0
+    total = float(x.sum(dtype=np.float64))
+    kernel = _gini_hhi_nb_parallel if n >= _PARALLEL_MIN_HOLDERS else _gini_hhi_nb
+    gini, hhi = kernel(x, total)
+    return float(max(0.0, min(1.0, gini))), float(hhi)
+
 
-def top_holders_sqlite(db: DBPath, contract: str, n: int = 10, as_of_block: Optional[int] = None) -> List[Dict]:
-    return balances_as_of_sqlite(db, contract, as_of_block)[: int(n)]
+__all__ = [
+    "DBPath",
+    "DBLike",
+    "get_conn",
+    "holder_balances_columnar",
+    "holder_balances_sqlite",
+    "iter_holder_balances",
+    "iter_balances_as_of_sqlite",
+    "balances_as_of_sqlite",
+    "top_holders_sqlite",
+]
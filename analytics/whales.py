@@ -1,22 +1,85 @@
-from typing import Dict, Iterable, List, Optional
-from analytics.holders import holder_balances_sqlite
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from analytics import holders
+from analytics.token_holders import (
+    DBLike,
+    Columns,
+    ZERO_ADDRESS,
+    _INT64_SAFE,
+    _as_conn,
+    _balances_source,
+    _int_array,
+    _select_sql,
+    _to_dicts,
+    _tuple_cursor,
+    holder_balances_columnar,
+)
 import os
+import sqlite3
+
+import numpy as np
 
 DBG = os.getenv("DEBUG_ONCHAIN") == "1"
 def dbg(*a):
     if DBG:
         print(*a, flush=True)
 
-DBLike = str
+def _resolve_scope(db: DBLike, contract: Optional[str], as_of_block: Optional[int]) -> Optional[str]:
+    """
+    contract when it has any positive balance, else None so callers read every contract.
+    """
+    if not contract:
+        return None
+    _, top = holder_balances_columnar(db, contract, as_of_block, n=1)
+    return contract if len(top) and top[0] > 0 else None
 
-def _balances_strict_then_fallback(db: DBLike, contract: Optional[str], as_of_block: Optional[int]) -> List[dict]:
-    rows = holder_balances_sqlite(db, contract, as_of_block)
-    total = sum(int(r["balance"]) for r in rows)
-    if total == 0:
-        rows = holder_balances_sqlite(db, None, as_of_block)
-    rows.sort(key=lambda r: int(r["balance"]), reverse=True)
-    dbg("whales balances rows=", rows)
-    return rows
+def _positive_holders(
+    db: DBLike,
+    contract: Optional[str],
+    as_of_block: Optional[int],
+    n: Optional[int] = None,
+    min_balance: int = 1,
+) -> Columns:
+    """
+    Positive balances outside the burn sink, largest first; threshold, zero address
+    filter and limit all run in SQL.
+    """
+    opts = {"n": n, "min_balance": max(int(min_balance), 1), "exclude_burn": True}
+    addrs, bals = holder_balances_columnar(db, contract, as_of_block, **opts)
+    # an empty result can also mean nobody clears min_balance, only probe the scope then
+    if contract and not len(bals) and _resolve_scope(db, contract, as_of_block) is None:
+        addrs, bals = holder_balances_columnar(db, None, as_of_block, **opts)
+    if DBG:
+        dbg("whales balances rows=", list(zip(addrs.tolist(), bals.tolist())))
+    return addrs, bals
+
+def concentration_ratios(
+    balances_raw: Sequence[int],
+    ks: Iterable[int],
+    total_supply_raw: Optional[float] = None,
+) -> Dict[int, float]:
+    """
+    Share of total_supply_raw held by the top k balances, for every k in ks.
+    One partial sort and one prefix sum serve all ks; total defaults to the sum of balances_raw.
+    """
+    ks = [int(k) for k in ks]
+    x = np.asarray(balances_raw)
+    if not x.size:
+        return {k: 0.0 for k in ks}
+    # only the max(ks) largest need ordering; partition selects them in linear time
+    m = min(max(max(ks, default=0), 0), x.size)
+    top = np.partition(x, x.size - m)[x.size - m:] if 0 < m < x.size else x[x.size - m:]
+    top = np.sort(top)[::-1]
+    # exact int64 prefix sums while the total fits, float64 so wei-scale totals cannot wrap
+    if x.dtype.kind == "i" and float(x.sum(dtype=np.float64)) < _INT64_SAFE:
+        prefix = np.cumsum(top)
+        supply = x.sum()
+    else:
+        prefix = np.cumsum(top, dtype=np.float64)
+        supply = x.sum(dtype=np.float64)
+    total = total_supply_raw if total_supply_raw is not None else supply.item()
+    if total <= 0:
+        return {k: 0.0 for k in ks}
+    return {k: prefix[min(k, prefix.size) - 1].item() / total if k > 0 else 0.0 for k in ks}
 
 def concentration_ratios_sqlite(
     db: DBLike,
@@ -24,39 +87,122 @@ def concentration_ratios_sqlite(
     ks: Iterable[int],
     as_of_block: Optional[int] = None,
 ) -> Dict[int, float]:
-    bals = _balances_strict_then_fallback(db, contract, as_of_block)
+    """
+    Top k shares of the positive, non burn supply. Prefix sums run as window functions in
+    SQLite, so only max(ks) rows come back whatever the holder count.
+    """
+    ks = [int(k) for k in ks]
+    if not holders._HAS_WINDOW_FUNCTIONS:
+        positives = _stream_positives(db, contract, as_of_block)
+        # fallback again if strict filter produced nothing
+        if not positives.size and contract:
+            positives = _stream_positives(db, None, as_of_block)
+        return concentration_ratios(positives, ks)
+    con = _as_conn(db)
+    prefix, n, total = _top_prefix_sql(con, contract, as_of_block, ks)
+    # fallback again if strict filter produced nothing
+    if not prefix:
+        prefix, n, total = _top_prefix_sql(con, None, as_of_block, ks)
+    if not prefix or total <= 0:
+        return {k: 0.0 for k in ks}
+    return {k: prefix[min(k, n)] / total if k > 0 else 0.0 for k in ks}
+
+def _stream_positives(db: DBLike, contract: Optional[str], as_of_block: Optional[int]) -> np.ndarray:
+    """
+    Positive, non burn balances as an int64 array (float64 past int64), read as a single
+    column off a plain tuple cursor; addresses never leave SQLite.
+    """
+    con = _as_conn(db)
+    source, params = _balances_source(con, contract, as_of_block)
+    sql, params = _select_sql(source, params, min_balance=1, exclude_burn=True)
+    cur = _tuple_cursor(con).execute(f"SELECT balance FROM ({sql})", params)
+    return _int_array([r[0] for r in cur])
 
-    # filter out burn sink and any nonpositive balances
-    positives = [
-        int(b["balance"])
-        for b in bals
-        if int(b["balance"]) > 0 and b.get("address", "").lower() != "0x" + "0" * 40
-    ]
+def _top_prefix_sql(
+    con: sqlite3.Connection, contract: Optional[str], as_of_block: Optional[int], ks: Sequence[int]
+) -> Tuple[Dict[int, float], int, float]:
+    """
+    Running sums of the largest positive, non burn balances at each rank in ks (and at the
+    last holder when there are fewer than max(ks)), the holder count and the overall total.
+    One sort serves every k and only those rows come back. TOTAL() keeps wei-scale sums
+    from overflowing SQLite integers.
+    """
+    source, params = _balances_source(con, contract, as_of_block)
+    ranks = ", ".join(str(k) for k in sorted({int(k) for k in ks if int(k) > 0})) or "1"
+    rows = con.execute(
+        f"""
+        WITH ranked AS (
+          SELECT ROW_NUMBER() OVER (ORDER BY balance DESC)                          AS rn,
+                 TOTAL(balance) OVER (ORDER BY balance DESC ROWS UNBOUNDED PRECEDING) AS pref,
+                 TOTAL(balance) OVER ()                                             AS total,
+                 COUNT(*) OVER ()                                                   AS n
+            FROM ({source})
+           WHERE balance > 0 AND address <> :zero
+        )
+        SELECT rn, pref, n, total FROM ranked WHERE rn IN ({ranks}) OR rn = n
+        """,
+        {**params, "zero": ZERO_ADDRESS},
+    ).fetchall()
+    if not rows:
+        return {}, 0, 0.0
+    return {r[0]: r[1] for r in rows}, rows[0][2], rows[0][3]
+
+def _ratios_from(db: DBLike, cols: Columns, ks: Iterable[int], as_of_block: Optional[int]) -> Dict[int, float]:
+    positives = cols[1]
 
     # fallback again if strict filter produced nothing
-    if not positives:
-        bals = _balances_strict_then_fallback(db, None, as_of_block)
-        positives = [
-            int(b["balance"])
-            for b in bals
-            if int(b["balance"]) > 0 and b.get("address", "").lower() != "0x" + "0" * 40
-        ]
+    if not len(positives):
+        positives = _positive_holders(db, None, as_of_block)[1]
 
-    if not positives:
-        return {int(k): 0.0 for k in ks}
+    return concentration_ratios(positives, ks)
 
-    positives.sort(reverse=True)
-    total = sum(positives)
-    return {int(k): sum(positives[: int(k)]) / total for k in ks}
 
+def find_whales_columnar(
+    db: DBLike,
+    contract: Optional[str],
+    min_balance: int,
+    as_of_block: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Columns:
+    """
+    Holders with balance >= min_balance as (addresses, balances) arrays, largest first, at most
+    limit rows; the burn sink is never a whale. Threshold and limit are applied in SQL.
+    """
+    return _whales_from(_positive_holders(db, contract, as_of_block, n=limit, min_balance=min_balance), min_balance)
 
 def find_whales_sqlite(
     db: DBLike,
     contract: Optional[str],
     min_balance: int,
     as_of_block: Optional[int] = None,
+    limit: Optional[int] = None,
 ) -> List[Dict]:
-    bals = _balances_strict_then_fallback(db, contract, as_of_block)
-    out = [b for b in bals if int(b["balance"]) >= int(min_balance)]
+    """
+    find_whales_columnar as a list of {"address", "balance"} dicts.
+    """
+    out = _to_dicts(find_whales_columnar(db, contract, min_balance, as_of_block, limit))
     dbg("whales find out=", out)
     return out
+
+def _whales_from(cols: Columns, min_balance: int) -> Columns:
+    addrs, bals = cols
+    keep = bals >= int(min_balance)
+    return addrs[keep], bals[keep]
+
+
+def analyze_whales(
+    db: DBLike,
+    contract: Optional[str],
+    min_balance: int,
+    ks: Iterable[int],
+    as_of_block: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict:
+    """
+    find_whales_sqlite and concentration_ratios_sqlite over a single balance fetch.
+    """
+    cols = _positive_holders(db, contract, as_of_block)
+    addrs, bals = _whales_from(cols, min_balance)
+    if limit is not None:
+        addrs, bals = addrs[: int(limit)], bals[: int(limit)]
+    return {"whales": _to_dicts((addrs, bals)), "cr": _ratios_from(db, cols, ks, as_of_block)}
@@ -3,7 +3,6 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import time
 from dataclasses import dataclass
 from typing import Any, AsyncIterator, Dict, List
@@ -41,11 +40,14 @@ class MemoryBroker(Broker):
     one never yield while holding a lock
     two reads compute the next message under lock then release before returning it
     three commits only update the committed offset if it moves forward
+    four published values are stored without copying, so callers must not mutate a dict
+    after publishing it and consumers must treat message values as read only
     """
 
     def __init__(self) -> None:
         self._topics: Dict[str, List[Message]] = {}
         self._locks: Dict[str, asyncio.Lock] = {}
+        self._conds: Dict[str, asyncio.Condition] = {}  # share the topic lock, notified on publish
         self._offsets: Dict[str, Dict[str, int]] = {}  # topic -> group -> offset
 
     def _lock(self, topic: str) -> asyncio.Lock:
@@ -53,19 +55,26 @@ class MemoryBroker(Broker):
             self._locks[topic] = asyncio.Lock()
         return self._locks[topic]
 
+    def _cond(self, topic: str) -> asyncio.Condition:
+        if topic not in self._conds:
+            self._conds[topic] = asyncio.Condition(self._lock(topic))
+        return self._conds[topic]
+
     async def publish(self, topic: str, key: str, value: Dict[str, Any]) -> int:
-        async with self._lock(topic):
+        cond = self._cond(topic)
+        async with cond:
             seq = self._topics.setdefault(topic, [])
             offset = len(seq)
             msg = Message(
                 topic=topic,
                 offset=offset,
                 key=str(key),
-                value=json.loads(json.dumps(value)),  # json safe copy
+                value=value,  # stored as is, see publish contract above
                 produced_at=time.time(),
                 schema_version="v1",
             )
             seq.append(msg)
+            cond.notify_all()
             return offset
 
     async def subscribe(self, topic: str, group_id: str) -> AsyncIterator[Message]:
@@ -73,20 +82,17 @@ class MemoryBroker(Broker):
         start = await self.get_offset(topic, group_id)
         next_offset = start + 1
 
+        cond = self._cond(topic)
         while True:
-            # fetch next message reference under lock then release before yielding
-            async with self._lock(topic):
+            # wait for the next message under lock then release before yielding
+            async with cond:
                 seq = self._topics.setdefault(topic, [])
-                msg = seq[next_offset] if next_offset < len(seq) else None
-
-            if msg is not None:
-                next_offset += 1
-                # yield outside the lock to avoid deadlocks with commit
-                yield msg
-                continue
+                await cond.wait_for(lambda: next_offset < len(seq))
+                msg = seq[next_offset]
 
-            # no new messages yet
-            await asyncio.sleep(0.01)
+            next_offset += 1
+            # yield outside the lock to avoid deadlocks with commit
+            yield msg
 
     async def commit(self, topic: str, group_id: str, offset: int) -> None:
         async with self._lock(topic):
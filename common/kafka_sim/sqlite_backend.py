@@ -4,13 +4,21 @@ from __future__ import annotations
 
 import asyncio
 import json
+import re
 import sqlite3
 import time
 from dataclasses import dataclass
-from typing import Any, AsyncIterator, Dict, Optional
+from typing import Any, AsyncIterator, Dict, List
 
 # reuse the Broker and Message types so tests stay consistent
 from .memory import Broker, Message
+from ..utils import SQLITE_STATEMENT_CACHE
+
+try:
+    # optional; orjson may not be installed
+    import orjson
+except Exception:  # pragma: no cover
+    orjson = None
 
 
 _SCHEMA = """
@@ -26,6 +34,15 @@ CREATE TABLE IF NOT EXISTS messages (
 );
 CREATE INDEX IF NOT EXISTS idx_messages_topic_offset ON messages(topic, offset);
 
+-- next offset to hand out per topic, bumped atomically on publish
+CREATE TABLE IF NOT EXISTS topic_seq (
+  topic       TEXT PRIMARY KEY,
+  next_offset INTEGER NOT NULL
+);
+-- seed counters for topics without one yet, e.g. written before topic_seq existed
+INSERT OR IGNORE INTO topic_seq(topic, next_offset)
+  SELECT topic, MAX(offset) + 1 FROM messages GROUP BY topic;
+
 CREATE TABLE IF NOT EXISTS consumer_offsets (
   topic      TEXT NOT NULL,
   group_id   TEXT NOT NULL,
@@ -35,6 +52,46 @@ CREATE TABLE IF NOT EXISTS consumer_offsets (
 );
 """
 
+# throughput settings for the simulated broker; a crash may drop the last commits, never corrupt
+_FAST_PRAGMAS = """
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+PRAGMA wal_autocheckpoint=10000;
+"""
+
+# messages read per subscribe roundtrip
+_FETCH_BATCH = 256
+
+# UPSERT ... RETURNING needs SQLite 3.35+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_NEXT_OFFSET_SQL = """
+INSERT INTO topic_seq(topic, next_offset) VALUES (?, 1)
+ON CONFLICT(topic) DO UPDATE SET next_offset = next_offset + 1
+"""
+
+
+def _dumps(value: Dict[str, Any]) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode()
+        except TypeError:
+            # orjson rejects ints wider than 64 bits and non-str keys; raw token amounts can be both
+            pass
+    return json.dumps(value)
+
+
+# orjson.loads turns integers past 64 bits into floats, so payloads holding one go through json
+_WIDE_INT = re.compile(r"\d{20}")
+
+
+def _loads(text: str) -> Dict[str, Any]:
+    if orjson is not None and not _WIDE_INT.search(text):
+        return orjson.loads(text)
+    return json.loads(text)
+
 
 class SQLiteBroker(Broker):
     """
@@ -45,12 +102,15 @@ class SQLiteBroker(Broker):
     subscribe yields messages after the committed offset for group_id
     commit stores the highest processed offset for group_id
     get_offset returns the committed offset for group_id or -1 if none
+
+    durable=True keeps SQLite's default synchronous=FULL so every publish is fsynced
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, durable: bool = False):
         self.path = path
+        self.durable = durable
         # a single connection is fine for our usage here
-        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
         self._conn.row_factory = sqlite3.Row
         self._setup_done = False
         self._setup()
@@ -60,6 +120,8 @@ class SQLiteBroker(Broker):
             return
         cur = self._conn.cursor()
         cur.executescript(_SCHEMA)
+        if not self.durable:
+            cur.executescript(_FAST_PRAGMAS)
         self._conn.commit()
         self._setup_done = True
 
@@ -67,25 +129,33 @@ class SQLiteBroker(Broker):
 
     def _publish_sync(self, topic: str, key: str, value: Dict[str, Any]) -> int:
         cur = self._conn.cursor()
-        # compute next offset per topic
-        row = cur.execute("SELECT COALESCE(MAX(offset), -1) AS last FROM messages WHERE topic = ?", (topic,)).fetchone()
-        next_offset = int(row["last"]) + 1
+        # claim the next offset per topic; the write lock taken here is held until commit
+        if _HAS_RETURNING:
+            next_offset = int(cur.execute(_NEXT_OFFSET_SQL + " RETURNING next_offset - 1", (topic,)).fetchone()[0])
+        else:
+            cur.execute(_NEXT_OFFSET_SQL, (topic,))
+            next_offset = int(cur.execute("SELECT next_offset - 1 FROM topic_seq WHERE topic = ?", (topic,)).fetchone()[0])
         cur.execute(
             """
             INSERT INTO messages(topic, offset, key, value_json, produced_at, schema_version)
             VALUES (?, ?, ?, ?, ?, ?)
             """,
-            (topic, next_offset, str(key), json.dumps(value), float(time.time()), "v1"),
+            (topic, next_offset, str(key), _dumps(value), time.time(), "v1"),
         )
         self._conn.commit()
         return next_offset
 
-    def _get_row_sync(self, topic: str, offset: int) -> Optional[sqlite3.Row]:
+    def _get_rows_sync(self, topic: str, start_offset: int, limit: int) -> List[sqlite3.Row]:
         cur = self._conn.cursor()
         return cur.execute(
-            "SELECT topic, offset, key, value_json, produced_at, schema_version FROM messages WHERE topic = ? AND offset = ?",
-            (topic, int(offset)),
-        ).fetchone()
+            """
+            SELECT topic, offset, key, value_json, produced_at, schema_version FROM messages
+            WHERE topic = ? AND offset >= ?
+            ORDER BY offset
+            LIMIT ?
+            """,
+            (topic, int(start_offset), int(limit)),
+        ).fetchall()
 
     def _commit_sync(self, topic: str, group_id: str, offset: int) -> None:
         cur = self._conn.cursor()
@@ -119,21 +189,21 @@ class SQLiteBroker(Broker):
         start = await self.get_offset(topic, group_id)
         next_offset = start + 1
         while True:
-            # fetch the next row without blocking the event loop
-            row = await asyncio.to_thread(self._get_row_sync, topic, next_offset)
-            if row is not None:
+            # fetch the next batch without blocking the event loop, one thread hop per batch
+            rows = await asyncio.to_thread(self._get_rows_sync, topic, next_offset, _FETCH_BATCH)
+            for row in rows:
                 msg = Message(
                     topic=row["topic"],
                     offset=int(row["offset"]),
                     key=row["key"],
-                    value=json.loads(row["value_json"]),
+                    value=_loads(row["value_json"]),
                     produced_at=float(row["produced_at"]),
                     schema_version=row["schema_version"],
                 )
-                next_offset += 1
+                next_offset = msg.offset + 1
                 yield msg
-                continue
-            await asyncio.sleep(0.01)
+            if not rows:
+                await asyncio.sleep(0.01)
 
     async def commit(self, topic: str, group_id: str, offset: int) -> None:
         await asyncio.to_thread(self._commit_sync, topic, group_id, offset)
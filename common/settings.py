@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pydantic import BaseModel, field_validator, ValidationError
 
 class RPC(BaseModel):
@@ -43,13 +44,23 @@ class Settings(BaseModel):
     providers: Providers = Providers()
 
 def load_settings(path: str = "config.yaml") -> Settings:
+    """
+    Parsed and validated settings, cached until the file or RPC_URL_OVERRIDE changes.
+    The returned Settings is shared between callers, treat it as read only.
+    """
+    st = os.stat(path)
+    return _load_cached(os.path.abspath(path), st.st_mtime_ns, st.st_size, os.environ.get("RPC_URL_OVERRIDE"))
+
+@lru_cache(maxsize=4)
+def _load_cached(path: str, mtime_ns: int, size: int, env_rpc: str | None) -> Settings:
     import yaml
+    # libyaml backed loader when available
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(path, "r") as f:
-        cfg = yaml.safe_load(f) or {}
+        cfg = yaml.load(f, Loader=loader) or {}
 
     # allow secure override via env at runtime
     if "rpc" in cfg:
-        env_rpc = os.environ.get("RPC_URL_OVERRIDE")
         if env_rpc:
             cfg["rpc"]["url"] = env_rpc
 
@@ -3,6 +3,12 @@ common.utils
 
 Utility helper functions.
 """
+
+# prepared statements sqlite3 keeps per connection; every SQLite user here issues a small set of
+# fixed or generated query texts, so repeats skip re-parsing and re-planning
+SQLITE_STATEMENT_CACHE = 256
+
+
 def chunked(start: int, end: int, size: int):
     """
     Yield (start, end) subranges of given size.
@@ -2,39 +2,101 @@
 
 from __future__ import annotations
 
+import inspect
 import io
 import os
+import queue
 import sqlite3
 import zipfile
-from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from collections import abc
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Tuple, Sequence
+from pathlib import Path
+from typing import Iterator, Tuple, Sequence, get_args, get_origin
 
 import numpy as np
 import pandas as pd
 import streamlit as st
 
+from common.utils import SQLITE_STATEMENT_CACHE
+
+try:
+    # optional; numba may not be installed
+    from numba import njit
+except Exception:  # pragma: no cover
+    njit = None
+
+try:
+    # optional; duckdb may not be installed
+    import duckdb
+except Exception:  # pragma: no cover
+    duckdb = None
+
+try:
+    # optional; pyarrow ships with streamlit but is not required here
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except Exception:  # pragma: no cover
+    pa = pa_csv = None
+
 
 # ============================================================
 # pure helpers that tests can import safely
 # ============================================================
 
-def gini_coefficient(values: Sequence[float] | np.ndarray) -> float:
-    arr = np.asarray(values, dtype=float)
-    arr = arr[np.isfinite(arr)]
-    arr = arr[arr > 0]
-    if arr.size == 0:
-        return 0.0
-    arr.sort()
-    n = arr.size
-    cum = np.cumsum(arr)
-    g = (n + 1 - 2 * np.sum(cum) / cum[-1]) / n
+# holder count from which the compiled Gini kernel beats the NumPy temporaries
+_NUMBA_MIN_HOLDERS = 100_000
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _gini_sorted_nb(x):
+        # sum(x) and sum(rank * x) in one pass over ascending input, skipping values
+        # that are not finite and positive; no mask, index or product arrays
+        n = 0
+        s = 0.0
+        w = 0.0
+        for i in range(x.size):
+            xi = x[i]
+            if xi > 0.0 and xi < np.inf:
+                n += 1
+                s += xi
+                w += n * xi
+        return (2.0 * w / s - (n + 1)) / n if s > 0 else 0.0
+
+
+def gini_coefficient(values: Sequence[float] | np.ndarray, assume_sorted: bool = False) -> float:
+    """
+    Gini over the finite positive values; pass assume_sorted when they are already ascending.
+    Integer input is filtered and sorted as integers, floats only enter the final ratio.
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind not in "iu":
+        arr = np.asarray(arr, dtype=float)
+    if assume_sorted and njit is not None and arr.size >= _NUMBA_MIN_HOLDERS:
+        g = _gini_sorted_nb(arr)
+    else:
+        arr = arr[arr > 0] if arr.dtype.kind in "iu" else arr[np.isfinite(arr) & (arr > 0)]
+        if arr.size == 0:
+            return 0.0
+        if not assume_sorted:
+            arr = np.sort(arr)
+        n = arr.size
+        idx = np.arange(1, n + 1, dtype=np.float64)
+        g = (2.0 * np.dot(idx, arr) / arr.sum(dtype=np.float64) - (n + 1)) / n
     g = float(max(0.0, min(1.0, g)))
     return g
 
 
-def concentration_ratios(values: Sequence[float] | np.ndarray, ks=(1, 2, 3, 5, 10)) -> pd.DataFrame:
+def concentration_ratios(
+    values: Sequence[float] | np.ndarray, ks=(1, 2, 3, 5, 10), total: float | None = None
+) -> pd.DataFrame:
+    """
+    Top k shares of total, which defaults to the sum of the finite positive values.
+    With total given, values only needs to hold the max(ks) largest balances.
+    """
     arr = np.asarray(values, dtype=float)
     arr = arr[np.isfinite(arr)]
     arr = arr[arr > 0]
@@ -42,7 +104,7 @@ def concentration_ratios(values: Sequence[float] | np.ndarray, ks=(1, 2, 3, 5, 1
         return pd.DataFrame({"k": list(ks), "ratio": [0.0] * len(ks), "ratio_pct": [0.0] * len(ks)})
     arr.sort()
     arr = arr[::-1]
-    total = float(arr.sum())
+    total = float(arr.sum()) if total is None else float(total)
     out = []
     for k in ks:
         k = int(max(0, k))
@@ -57,22 +119,174 @@ def concentration_ratios(values: Sequence[float] | np.ndarray, ks=(1, 2, 3, 5, 1
 # light db utilities
 # ============================================================
 
+ZERO_ADDRESS = "0x" + "0" * 40
+
+
 @dataclass
 class DbCfg:
     path: str
 
 
+# pools and DuckDB handles kept at once; older ones (another path typed into the sidebar,
+# a replaced file) are dropped and their connections closed by the collector
+_RESOURCE_ENTRIES = 4
+
+# read only connections kept per DB path; streamlit reruns borrow them instead of reopening the file
+_POOL_SIZE = max(4, os.cpu_count() or 1)
+
+# per connection read settings, applied once when the connection is opened
+_READ_PRAGMAS = """
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+PRAGMA temp_store=MEMORY;
+"""
+
+
 def connect(cfg: DbCfg) -> sqlite3.Connection:
-    con = sqlite3.connect(cfg.path, check_same_thread=False)
+    """
+    Plain connection with the read settings. The dashboard never changes the file: indexes,
+    journal mode and balances_latest belong to the ingest side (storage.sqlite_backend).
+    """
+    con = sqlite3.connect(cfg.path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
+    con.row_factory = sqlite3.Row
+    con.executescript(_READ_PRAGMAS)
+    return con
+
+
+def connect_readonly(cfg: DbCfg) -> sqlite3.Connection:
+    con = sqlite3.connect(
+        Path(cfg.path).absolute().as_uri() + "?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+    )
     con.row_factory = sqlite3.Row
+    con.executescript(_READ_PRAGMAS)
     return con
 
 
-def q(con: sqlite3.Connection, sql: str, params: tuple = ()) -> pd.DataFrame:
-    return pd.read_sql_query(sql, con, params=params)
+# DuckDB's sqlite extension is only loaded, never downloaded, unless this is set to 1. Install it
+# once ahead of time with: python -c "import duckdb; duckdb.execute('INSTALL sqlite')"
+_DUCK_INSTALL_ENV = "ONI_DUCKDB_INSTALL"
+
+
+def connect_duck(path: str):
+    """
+    In memory DuckDB with the SQLite file attached read only, for the scan heavy aggregates.
+    None when duckdb or its sqlite extension is not installed; callers then stay on sqlite3.
+    """
+    if duckdb is None:
+        return None
+    try:
+        con = duckdb.connect()
+        if os.getenv(_DUCK_INSTALL_ENV) == "1":
+            con.execute("INSTALL sqlite")
+        con.execute("LOAD sqlite")
+        con.execute(f"ATTACH '{path.replace(chr(39), chr(39) * 2)}' AS db (TYPE SQLITE, READ_ONLY)")
+        con.execute("USE db")
+    except duckdb.Error:
+        return None
+    return con
+
+
+def _file_id(db_path: str) -> Tuple[int, int]:
+    # device and inode: a DB rebuilt or swapped in under the same path gets fresh connections,
+    # which would otherwise keep reading the old, unlinked file
+    try:
+        st_ = os.stat(db_path)
+        return st_.st_dev, st_.st_ino
+    except OSError:
+        return 0, 0
+
+
+@st.cache_resource(show_spinner=False, max_entries=_RESOURCE_ENTRIES)
+def _duck_for(db_path: str, file_id: Tuple[int, int]):
+    return connect_duck(db_path)
+
+
+def get_duck(db_path: str):
+    return _duck_for(db_path, _file_id(db_path))
+
+
+@st.cache_resource(show_spinner=False, max_entries=_RESOURCE_ENTRIES)
+def _pool_for(db_path: str, file_id: Tuple[int, int]) -> queue.Queue:
+    pool: queue.Queue = queue.Queue(maxsize=_POOL_SIZE)
+    for _ in range(_POOL_SIZE):
+        pool.put_nowait(connect_readonly(DbCfg(db_path)))
+    return pool
+
+
+def get_pool(db_path: str) -> queue.Queue:
+    """
+    Process wide pool of read only connections for db_path, one per file behind the path.
+    The file is only ever opened read only, so reruns never queue on the write lock.
+    """
+    return _pool_for(db_path, _file_id(db_path))
+
+
+@contextmanager
+def borrow(pool: queue.Queue) -> Iterator[sqlite3.Connection]:
+    con = pool.get()
+    try:
+        yield con
+    finally:
+        pool.put(con)
+
+
+# independent reads for one view run side by side on their own pooled connections; sqlite3
+# drops the GIL while a statement steps, so wall time is the slowest query, not the sum
+_METRIC_WORKERS = ThreadPoolExecutor(max_workers=4, thread_name_prefix="oni-reads")
+
+
+def _pooled(pool: queue.Queue, fn, *args):
+    # each task borrows and returns its own connection, so no thread holds one while waiting
+    with borrow(pool) as con:
+        return fn(con, *args)
+
+
+def q(con: sqlite3.Connection, sql: str, params: tuple | dict = (), dtypes: dict | None = None) -> pd.DataFrame:
+    """
+    Result set as a DataFrame built from plain tuple rows in one go, rather than
+    read_sql_query walking sqlite3.Row objects; same frame, less per row work.
+    dtypes pins column types, so empty results and NULL-only columns come back typed too.
+    """
+    cur = con.cursor()
+    cur.row_factory = None
+    rows = cur.execute(sql, params).fetchall()
+    df = pd.DataFrame.from_records(rows, columns=[d[0] for d in cur.description])
+    return df.astype(dtypes, copy=False) if dtypes else df
+
+
+def scalar(con: sqlite3.Connection, sql: str, params: tuple | dict = ()):
+    """
+    First column of the first row, or None; no DataFrame for single value reads.
+    """
+    row = con.execute(sql, params).fetchone()
+    return row[0] if row else None
+
+
+def column(con: sqlite3.Connection, sql: str, params: tuple | dict = ()) -> np.ndarray:
+    """
+    First column of every row as a float array, filled straight from the cursor.
+    Plain tuple rows here; building a sqlite3.Row per balance costs more than the read.
+    """
+    cur = con.cursor()
+    cur.row_factory = None
+    return np.fromiter((r[0] for r in cur.execute(sql, params)), dtype=np.float64)
+
+
+def _has_table(con, name: str) -> bool:
+    sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    return con.execute(sql, (name,)).fetchone() is not None
+
+
+_CONTRACTS_LIMIT = 200
 
 
 def list_contracts(con) -> pd.DataFrame:
+    if _has_table(con, "contracts"):
+        # the registry SQLiteStorage keeps of transfer and balances contracts, lowercased
+        return q(con, "SELECT contract FROM contracts ORDER BY contract LIMIT ?;", (_CONTRACTS_LIMIT,))
     sql = """
     WITH c AS (
       SELECT DISTINCT contract FROM balances
@@ -81,11 +295,12 @@ def list_contracts(con) -> pd.DataFrame:
     )
     SELECT c.contract
     FROM c
-    ORDER BY c.contract;
+    ORDER BY c.contract
+    LIMIT ?;
     """
     try:
-        return q(con, sql)
-    except Exception:
+        return q(con, sql, (_CONTRACTS_LIMIT,))
+    except sqlite3.OperationalError:
         return pd.DataFrame(columns=["contract"])
 
 
@@ -93,142 +308,245 @@ def read_metadata(con, contract: str) -> tuple[str, int]:
     sql = """
     SELECT symbol, COALESCE(decimals, 0) AS decimals
     FROM erc20_metadata
-    WHERE LOWER(contract) = LOWER(?)
+    WHERE contract = ? COLLATE NOCASE
     LIMIT 1;
     """
-    df = q(con, sql, (contract,))
-    if df.empty:
+    row = con.execute(sql, (contract.lower(),)).fetchone()
+    if row is None:
         return "N A", 0
-    row = df.iloc[0]
-    sym = row["symbol"] if isinstance(row["symbol"], str) and row["symbol"].strip() else "N A"
-    return sym, int(row["decimals"])
+    symbol, decimals = row[0], row[1]
+    sym = symbol if isinstance(symbol, str) and symbol.strip() else "N A"
+    return sym, int(decimals)
 
 
 def pick_latest_block(con, contract: str) -> int:
     sql = """
     SELECT MAX(block_number) AS last_block
     FROM balances
-    WHERE LOWER(contract) = LOWER(?);
+    WHERE contract = ? COLLATE NOCASE;
     """
-    df = q(con, sql, (contract,))
-    return int(df.iloc[0]["last_block"]) if not df.empty and df.iloc[0]["last_block"] is not None else 0
+    return int(scalar(con, sql, (contract.lower(),)) or 0)
 
 
-def holders_count(con, contract: str, as_of: int) -> int:
-    sql = """
-    SELECT COUNT(*) AS holders
-    FROM (
-        SELECT address
-        FROM balances
-        WHERE LOWER(contract) = LOWER(?)
-          AND block_number <= ?
-        GROUP BY address
-        HAVING MAX(balance_units) > 0
-    ) t;
-    """
-    df = q(con, sql, (contract, as_of))
-    return int(df.iloc[0]["holders"]) if not df.empty else 0
+_LATEST_SOURCE = "SELECT address, balance_units AS bal FROM balances_latest WHERE contract = ?"
 
+# balances_latest is current while the balances generation, bumped by the triggers the ingest
+# side installs, still equals the one it was built at
+_LATEST_FRESH = """
+SELECT 1 FROM balances_latest_built b JOIN table_generations g ON g.name = 'balances'
+WHERE b.generation = g.generation
+"""
 
-def total_supply(con, contract: str, as_of: int) -> float:
-    sql = """
-    SELECT SUM(balance_units) AS total_units
-    FROM (
-        SELECT address, MAX(balance_units) AS balance_units
-        FROM balances
-        WHERE LOWER(contract) = LOWER(?)
-          AND block_number <= ?
-        GROUP BY address
-    );
-    """
-    df = q(con, sql, (contract, as_of))
-    return float(df.iloc[0]["total_units"]) if not df.empty and df.iloc[0]["total_units"] is not None else 0.0
 
+def _latest_is_fresh(con) -> bool:
+    if not _has_table(con, "balances_latest_built"):
+        return False
+    return scalar(con, _LATEST_FRESH) is not None
 
-def transfers_count(con, contract: str) -> int:
-    df = q(con, "SELECT COUNT(*) AS c FROM transfers WHERE LOWER(contract)=LOWER(?)", (contract,))
-    return int(df.iloc[0]["c"]) if not df.empty else 0
+
+def _serves_latest(con, contract: str, as_of: int) -> bool:
+    """True when as_of is answered by balances_latest rather than a GROUP BY over balances."""
+    return _latest_is_fresh(con) and as_of >= pick_latest_block(con, contract.lower())
 
 
-def gini_from_balances_db(con, contract: str, as_of: int) -> float:
+def _balances_source(con, contract: str, as_of: int, latest: bool | None = None) -> tuple[str, tuple]:
+    """
+    SQL yielding (address, bal) per holder as of a block, with its parameters. At or past the
+    contract's last block that is a read of balances_latest, as long as the ingest side rebuilt it
+    after the last balances write, otherwise a GROUP BY over balances. Callers that already
+    resolved _serves_latest pass it as latest.
+    """
+    c = contract.lower()
+    if latest is None:
+        latest = _serves_latest(con, c, as_of)
+    if latest:
+        return _LATEST_SOURCE, (c,)
     sql = """
-    SELECT MAX(balance_units) AS bal
+    SELECT address, MAX(balance_units) AS bal
     FROM balances
-    WHERE LOWER(contract) = LOWER(?)
+    WHERE contract = ? COLLATE NOCASE
       AND block_number <= ?
     GROUP BY address
-    HAVING MAX(balance_units) > 0
-    ORDER BY bal ASC;
     """
-    df = q(con, sql, (contract, as_of))
-    return gini_coefficient(df["bal"].to_numpy(dtype=float)) if not df.empty else 0.0
+    return sql, (c, as_of)
 
 
-def concentration_ratios_db(con, contract: str, as_of: int, ks=(1, 2, 3, 5, 10)) -> pd.DataFrame:
-    sql = """
-    SELECT MAX(balance_units) AS bal
-    FROM balances
-    WHERE LOWER(contract) = LOWER(?)
-      AND block_number <= ?
-    GROUP BY address
-    HAVING MAX(balance_units) > 0
-    ORDER BY bal DESC;
-    """
-    df = q(con, sql, (contract, as_of))
-    return concentration_ratios(df["bal"].to_numpy(dtype=float), ks=ks) if not df.empty else pd.DataFrame({"k": ks, "ratio": [0.0]*len(ks), "ratio_pct": [0.0]*len(ks)})
+def holders_count(con, contract: str, as_of: int, latest: bool | None = None) -> int:
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"SELECT COUNT(*) AS holders FROM ({src}) WHERE bal > 0;"
+    return int(scalar(con, sql, params) or 0)
 
 
-def top_holders(con, contract: str, as_of: int, n: int) -> pd.DataFrame:
-    sql = """
-    SELECT address, MAX(balance_units) AS balance_units
-    FROM balances
-    WHERE LOWER(contract) = LOWER(?)
-      AND block_number <= ?
-    GROUP BY address
-    HAVING MAX(balance_units) > 0
-    ORDER BY balance_units DESC
+def total_supply(con, contract: str, as_of: int, latest: bool | None = None) -> float:
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"SELECT SUM(bal) AS total_units FROM ({src});"
+    return float(scalar(con, sql, params) or 0.0)
+
+
+def transfers_count(con, contract: str) -> int:
+    # counted off the contract prefix of the transfers index, no table rows read
+    sql = "SELECT COUNT(*) AS c FROM transfers WHERE contract = ? COLLATE NOCASE"
+    return int(scalar(con, sql, (contract.lower(),)) or 0)
+
+
+def gini_sql(con, contract: str, as_of: int, latest: bool | None = None) -> float:
+    """
+    Gini worked out inside SQLite with ROW_NUMBER(), so one float comes back instead of every balance.
+    Needs window functions, SQLite 3.25 or later.
+    """
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"""
+    SELECT (2.0 * SUM(rn * bal) / SUM(bal) - (COUNT(*) + 1)) / COUNT(*) AS gini
+    FROM (
+        SELECT bal, ROW_NUMBER() OVER (ORDER BY bal) AS rn
+        FROM ({src})
+        WHERE bal > 0
+    );
+    """
+    g = scalar(con, sql, params)
+    return 0.0 if g is None else float(max(0.0, min(1.0, g)))
+
+
+def gini_from_balances_db(con, contract: str, as_of: int, latest: bool | None = None) -> float:
+    if sqlite3.sqlite_version_info >= (3, 25):
+        return gini_sql(con, contract, as_of, latest)
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"SELECT bal FROM ({src}) WHERE bal > 0 ORDER BY bal ASC;"
+    return gini_coefficient(column(con, sql, params), assume_sorted=True)
+
+
+def concentration_ratios_db(
+    con, contract: str, as_of: int, ks=(1, 2, 3, 5, 10), latest: bool | None = None
+) -> pd.DataFrame:
+    # only the max(ks) largest balances leave SQLite, the total rides along as a window sum
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"""
+    SELECT bal, SUM(bal) OVER () AS total
+    FROM ({src})
+    WHERE bal > 0
+    ORDER BY bal DESC
     LIMIT ?;
     """
-    df = q(con, sql, (contract, as_of, n))
-    if df.empty:
-        return df
-    df["address_short"] = df["address"].str.slice(0, 8) + "…"
-    return df
+    rows = con.execute(sql, (*params, max(max(ks, default=0), 1))).fetchall()
+    total = rows[0][1] if rows else None
+    return concentration_ratios([r[0] for r in rows], ks=ks, total=total)
 
 
-def whales(con, contract: str, as_of: int, threshold_units: float, n: int) -> pd.DataFrame:
-    sql = """
-    SELECT address, MAX(balance_units) AS balance_units
-    FROM balances
-    WHERE LOWER(contract) = LOWER(?)
-      AND block_number <= ?
-    GROUP BY address
-    HAVING MAX(balance_units) >= ?
-    ORDER BY balance_units DESC
+def compute_snapshot(
+    con, contract: str, as_of: int, ks=(1, 2, 3, 5, 10), duck=None, latest: bool | None = None
+) -> dict:
+    """
+    holders, total supply, gini and concentration ratios from one scan of balances.
+    Same results as holders_count, total_supply, gini_from_balances_db and concentration_ratios_db.
+    With a DuckDB connection from connect_duck, a historical as-of GROUP BY runs there instead.
+    """
+    src, params = _balances_source(con, contract, as_of, latest)
+    if duck is not None and src != _LATEST_SOURCE:
+        got = duck.execute(f"SELECT bal FROM ({src}) ORDER BY bal ASC NULLS FIRST", list(params)).fetchnumpy()
+        x = np.ma.filled(np.ma.asarray(got["bal"], dtype=np.float64), np.nan)
+    else:
+        x = column(con, f"SELECT bal FROM ({src}) ORDER BY bal ASC;", params)
+    positive = x[x > 0]
+    return {
+        "holders": int(positive.size),
+        "total": float(np.nansum(x)),
+        "gini": gini_coefficient(positive, assume_sorted=True),
+        "cr": concentration_ratios(positive, ks=ks),
+    }
+
+
+# column types of the holder tables, pinned rather than inferred per result. Addresses are
+# Arrow backed strings (pyarrow ships with streamlit), so chart and table payloads and the CSV
+# export read the buffers instead of boxing a Python str per cell; balance_units are decimal
+# adjusted amounts and stay float64
+_ADDRESS = pd.StringDtype("pyarrow")
+_HOLDER_DTYPES = {"address": _ADDRESS, "balance_units": "float64", "address_short": _ADDRESS}
+_BALANCE_DTYPES = {"address": _ADDRESS, "balance_units": "float64"}
+_DELTA_DTYPES = {"address": _ADDRESS, "transfer_in": "float64", "transfer_out": "float64",
+                 "mint_in": "float64", "burn_out": "float64"}
+
+
+def top_holders(con, contract: str, as_of: int, n: int, latest: bool | None = None) -> pd.DataFrame:
+    # the chart label is cut in SQL for just the rows returned, no pandas string pass
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"""
+    SELECT address, bal AS balance_units, SUBSTR(address, 1, 8) || '…' AS address_short
+    FROM ({src})
+    WHERE bal > 0
+    ORDER BY bal DESC
+    LIMIT ?;
+    """
+    return q(con, sql, (*params, n), _HOLDER_DTYPES)
+
+
+def whales(
+    con, contract: str, as_of: int, threshold_units: float, n: int, latest: bool | None = None
+) -> pd.DataFrame:
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"""
+    SELECT address, bal AS balance_units, SUBSTR(address, 1, 8) || '…' AS address_short
+    FROM ({src})
+    WHERE bal >= ?
+    ORDER BY bal DESC
     LIMIT ?;
     """
-    df = q(con, sql, (contract, as_of, threshold_units, n))
-    if df.empty:
-        return df
-    df["address_short"] = df["address"].str.slice(0, 8) + "…"
-    return df
+    return q(con, sql, (*params, threshold_units, n), _HOLDER_DTYPES)
+
+
+def holder_balances(con, contract: str, as_of: int, duck=None, latest: bool | None = None) -> pd.DataFrame:
+    """
+    Every holder's balance as of a block, largest first; one GROUP BY that the metrics,
+    top holders and whales are then sliced from instead of each running it again.
+    """
+    src, params = _balances_source(con, contract, as_of, latest)
+    sql = f"SELECT address, bal AS balance_units FROM ({src}) ORDER BY bal DESC"
+    if duck is not None and src != _LATEST_SOURCE:
+        return duck.execute(f"{sql} NULLS LAST", list(params)).df().astype(_BALANCE_DTYPES, copy=False)
+    return q(con, sql, params, _BALANCE_DTYPES)
+
 
+def snapshot_from_balances(df: pd.DataFrame, ks=(1, 2, 3, 5, 10)) -> dict:
+    """compute_snapshot's dict from a holder_balances frame."""
+    x = df["balance_units"].to_numpy(dtype=np.float64, na_value=np.nan)
+    positive = x[x > 0][::-1]
+    return {
+        "holders": int(positive.size),
+        "total": float(np.nansum(x)),
+        "gini": gini_coefficient(positive, assume_sorted=True),
+        "cr": concentration_ratios(positive, ks=ks),
+    }
 
-def holder_deltas(con, contract: str, start_excl: int, end_incl: int) -> pd.DataFrame:
+
+def _with_label(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(address_short=(df["address"].str.slice(0, 8) + "…").astype(_ADDRESS))
+
+
+def top_from_balances(df: pd.DataFrame, n: int) -> pd.DataFrame:
+    """top_holders rows out of a holder_balances frame."""
+    return _with_label(df[df["balance_units"] > 0].head(n).reset_index(drop=True))
+
+
+def whales_from_balances(df: pd.DataFrame, threshold_units: float, n: int) -> pd.DataFrame:
+    """whales rows out of a holder_balances frame."""
+    return _with_label(df[df["balance_units"] >= threshold_units].head(n).reset_index(drop=True))
+
+
+def holder_deltas(con, contract: str, start_excl: int, end_incl: int, duck=None) -> pd.DataFrame:
     if start_excl >= end_incl:
-        return pd.DataFrame(columns=["address", "transfer_in", "transfer_out", "mint_in", "burn_out"])
+        return pd.DataFrame(columns=list(_DELTA_DTYPES)).astype(_DELTA_DTYPES)
+    # each side is grouped on its own before the union, so the outer GROUP BY merges at most
+    # two rows per address; mint and burn legs are told apart by the bound zero address.
+    # $name parameters bind the same way in SQLite and DuckDB
     sql = """
     WITH tx AS (
       SELECT
-        block_number,
-        LOWER(contract) AS contract,
-        LOWER(src)  AS src,
-        LOWER(dst)  AS dst,
+        LOWER(src) AS src,
+        LOWER(dst) AS dst,
         amount_units AS amt
       FROM transfers
-      WHERE LOWER(contract) = LOWER(?)
-        AND block_number > ?
-        AND block_number <= ?
+      WHERE contract = $contract COLLATE NOCASE
+        AND block_number > $start
+        AND block_number <= $end
     )
     SELECT
       a.address,
@@ -237,18 +555,46 @@ def holder_deltas(con, contract: str, start_excl: int, end_incl: int) -> pd.Data
       SUM(a.mint_in)      AS mint_in,
       SUM(a.burn_out)     AS burn_out
     FROM (
-      SELECT dst AS address, SUM(amt) AS transfer_in, 0 AS transfer_out, 0 AS mint_in, 0 AS burn_out FROM tx WHERE src != '0x0000000000000000000000000000000000000000' GROUP BY dst
-      UNION ALL
-      SELECT src AS address, 0, SUM(amt), 0, 0 FROM tx WHERE dst != '0x0000000000000000000000000000000000000000' GROUP BY src
-      UNION ALL
-      SELECT dst AS address, 0, 0, SUM(amt), 0 FROM tx WHERE src = '0x0000000000000000000000000000000000000000' GROUP BY dst
+      SELECT dst AS address,
+             SUM(CASE WHEN src = $zero THEN 0 ELSE amt END) AS transfer_in,
+             0                                              AS transfer_out,
+             SUM(CASE WHEN src = $zero THEN amt ELSE 0 END) AS mint_in,
+             0                                              AS burn_out
+        FROM tx
+       GROUP BY dst
       UNION ALL
-      SELECT src AS address, 0, 0, 0, SUM(amt) FROM tx WHERE dst = '0x0000000000000000000000000000000000000000' GROUP BY src
+      SELECT src,
+             0,
+             SUM(CASE WHEN dst = $zero THEN 0 ELSE amt END),
+             0,
+             SUM(CASE WHEN dst = $zero THEN amt ELSE 0 END)
+        FROM tx
+       GROUP BY src
     ) a
     GROUP BY a.address
     ORDER BY (COALESCE(SUM(a.transfer_in),0) + COALESCE(SUM(a.mint_in),0) - COALESCE(SUM(a.transfer_out),0) - COALESCE(SUM(a.burn_out),0)) DESC;
     """
-    return q(con, sql, (contract, start_excl, end_incl))
+    params = {"contract": contract.lower(), "start": start_excl, "end": end_incl, "zero": ZERO_ADDRESS}
+    if duck is not None:
+        return duck.execute(sql, params).df().astype(_DELTA_DTYPES, copy=False)
+    return q(con, sql, params, _DELTA_DTYPES)
+
+
+def contract_bootstrap(con, contract: str) -> Tuple[int, int, str, int]:
+    """
+    First and last balance block, symbol and decimals for contract in one statement.
+    Same values as _block_bounds and read_metadata; the last block is also pick_latest_block.
+    """
+    sql = """
+    SELECT
+      (SELECT MIN(block_number) FROM balances WHERE contract = :c COLLATE NOCASE)                   AS lo,
+      (SELECT MAX(block_number) FROM balances WHERE contract = :c COLLATE NOCASE)                   AS hi,
+      (SELECT symbol FROM erc20_metadata WHERE contract = :c COLLATE NOCASE LIMIT 1)                AS symbol,
+      (SELECT COALESCE(decimals, 0) FROM erc20_metadata WHERE contract = :c COLLATE NOCASE LIMIT 1) AS decimals;
+    """
+    lo, hi, symbol, decimals = con.execute(sql, {"c": contract.lower()}).fetchone()
+    sym = symbol if isinstance(symbol, str) and symbol.strip() else "N A"
+    return int(lo or 0), int(hi or 0), sym, int(decimals or 0)
 
 
 def _latest_badge_html(as_of: int, db_max: int) -> str:
@@ -258,16 +604,172 @@ def _latest_badge_html(as_of: int, db_max: int) -> str:
 
 
 def _block_bounds(con, contract: str) -> Tuple[int, int]:
-    df = q(con, "SELECT MIN(block_number) AS lo, MAX(block_number) AS hi FROM balances WHERE LOWER(contract)=LOWER(?)", (contract,))
-    lo = int(df.iloc[0]["lo"]) if not df.empty and df.iloc[0]["lo"] is not None else 0
-    hi = int(df.iloc[0]["hi"]) if not df.empty and df.iloc[0]["hi"] is not None else 0
-    return lo, hi
+    lo, hi = con.execute(
+        "SELECT MIN(block_number) AS lo, MAX(block_number) AS hi FROM balances WHERE contract = ? COLLATE NOCASE", (contract.lower(),)
+    ).fetchone()
+    return int(lo or 0), int(hi or 0)
+
+
+def _write_csv(df: pd.DataFrame, sink) -> None:
+    """CSV bytes of df into a binary sink, through Arrow's writer when available."""
+    if pa_csv is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            table = None
+        if table is not None:
+            pa_csv.write_csv(table, sink, pa_csv.WriteOptions(quoting_style="needed"))
+            return
+    with io.TextIOWrapper(sink, encoding="utf-8", newline="", write_through=True) as text:
+        df.to_csv(text, index=False)
+
+
+def snapshot_zip(prefix: str, frames: Sequence[Tuple[str, pd.DataFrame]]) -> io.BytesIO:
+    """
+    Zip of the non empty frames as CSV under prefix/, rewound for reading.
+    Each CSV is written straight into the deflate stream, never held as one string.
+    Arrow formats the rows when pyarrow is importable, pandas otherwise.
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, df_out in frames:
+            if isinstance(df_out, pd.DataFrame) and not df_out.empty:
+                with z.open(f"{prefix}/{name}", "w", force_zip64=True) as zf:
+                    _write_csv(df_out, zf)
+    buf.seek(0)
+    return buf
+
+
+# ============================================================
+# cached reads, keyed on db path, file stamp and inputs
+# ============================================================
+
+_CACHE_TTL = 300
+
+
+def _db_stamp(db_path: str) -> Tuple[int, ...]:
+    """
+    mtime and size of the DB and its WAL so cached reads expire when ingestion writes.
+    """
+    out = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            stat = os.stat(path)
+            out += [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            out += [0, 0]
+    return tuple(out)
+
+
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def cached_contracts(db_path: str, stamp: Tuple[int, ...]) -> pd.DataFrame:
+    with borrow(get_pool(db_path)) as con:
+        return list_contracts(con)
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_contract_info(db_path: str, stamp: Tuple[int, ...], contract: str) -> Tuple[int, int, str, int]:
+    with borrow(get_pool(db_path)) as con:
+        return contract_bootstrap(con, contract)
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_latest_fresh(db_path: str, stamp: Tuple[int, ...]) -> bool:
+    """Whether balances_latest is current, resolved once per file stamp for every render."""
+    return _pooled(get_pool(db_path), _latest_is_fresh)
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_metrics(db_path: str, stamp: Tuple[int, ...], contract: str, as_of: int, latest: bool = False) -> dict:
+    """
+    Headline metrics for contract at as_of; independent of the table widgets. latest says
+    whether balances_latest answers as_of (see _serves_latest).
+    """
+    pool = get_pool(db_path)
+    xfers = _METRIC_WORKERS.submit(_pooled, pool, transfers_count, contract)
+    if latest:
+        with borrow(pool) as con:
+            snap = compute_snapshot(con, contract, as_of, latest=True)
+    else:
+        snap = snapshot_from_balances(cached_holder_balances(db_path, stamp, contract, as_of))
+    return {**snap, "transfers": xfers.result()}
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=16, show_spinner=False)
+def cached_holder_balances(db_path: str, stamp: Tuple[int, ...], contract: str, as_of: int) -> pd.DataFrame:
+    """
+    The one historical GROUP BY per contract and block that metrics, top holders and whales share.
+    """
+    duck = get_duck(db_path)
+    with borrow(get_pool(db_path)) as con:
+        return holder_balances(con, contract, as_of, duck and duck.cursor(), latest=False)
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_top_holders(
+    db_path: str, stamp: Tuple[int, ...], contract: str, as_of: int, n: int, latest: bool = False
+) -> pd.DataFrame:
+    # at the latest block balances_latest serves the first n off its index, cheaper than any slice
+    if latest:
+        with borrow(get_pool(db_path)) as con:
+            return top_holders(con, contract, as_of, n, latest=True)
+    return top_from_balances(cached_holder_balances(db_path, stamp, contract, as_of), n)
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_whales(
+    db_path: str, stamp: Tuple[int, ...], contract: str, as_of: int, threshold_units: float, n: int,
+    latest: bool = False,
+) -> pd.DataFrame:
+    if latest:
+        with borrow(get_pool(db_path)) as con:
+            return whales(con, contract, as_of, threshold_units, n, latest=True)
+    return whales_from_balances(cached_holder_balances(db_path, stamp, contract, as_of), threshold_units, n)
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_holder_deltas(
+    db_path: str, stamp: Tuple[int, ...], contract: str, start_excl: int, end_incl: int
+) -> pd.DataFrame:
+    duck = get_duck(db_path)
+    with borrow(get_pool(db_path)) as con:
+        return holder_deltas(con, contract, start_excl, end_incl, duck and duck.cursor())
 
 
 # ============================================================
 # app rendering runs only when called
 # ============================================================
 
+# expanders that report being opened; on older Streamlit releases every section is built up
+# front as before
+_LAZY_WIDGETS = "on_change" in inspect.signature(st.expander).parameters
+
+
+def _download_takes_callable() -> bool:
+    """Whether st.download_button accepts a callable for data, run only when it is clicked."""
+    try:
+        from streamlit.elements.widgets.button import DownloadButtonDataType
+    except ImportError:
+        return False
+    return any(get_origin(t) is abc.Callable for t in get_args(DownloadButtonDataType))
+
+
+_DEFERRED_DOWNLOADS = _download_takes_callable()
+
+
+@contextmanager
+def _lazy_section(label: str, key: str) -> Iterator[bool]:
+    """
+    Collapsed expander; yields whether it is open so the section only queries once shown.
+    """
+    if not _LAZY_WIDGETS:
+        st.subheader(label)
+        yield True
+        return
+    with st.expander(label, key=key, on_change="rerun"):
+        yield bool(st.session_state.get(key))
+
+
 def render_app() -> None:
     st.set_page_config(page_title="Onchain Network Insights", layout="wide")
     st.title("Onchain Network Insights Dashboard")
@@ -276,11 +778,10 @@ def render_app() -> None:
     with st.sidebar:
         st.header("Settings")
         db_path = st.text_input("SQLite DB path", os.environ.get("SQLITE_PATH", "data/dev.db"))
-        cfg = DbCfg(db_path)
+        stamp = _db_stamp(db_path)
 
         try:
-            with closing(connect(cfg)) as con:
-                contracts_df = list_contracts(con)
+            contracts_df = cached_contracts(db_path, stamp)
         except Exception as e:
             st.error(f"Could not open DB at {db_path}: {e}")
             st.stop()
@@ -292,13 +793,13 @@ def render_app() -> None:
             index=0,
             format_func=lambda x: x if x else "—"
         )
-        contract = (contract_input or pick_from_db or "").strip()
+        # lowercased once here so pasted checksum addresses share cache entries with picked ones
+        contract = (contract_input or pick_from_db or "").strip().lower()
         if not contract:
             st.info("Select or paste an ERC 20 contract to continue.")
             st.stop()
 
-        with closing(connect(cfg)) as con:
-            lo_bn, hi_bn = _block_bounds(con, contract)
+        lo_bn, hi_bn, symbol, decimals = cached_contract_info(db_path, stamp, contract)
 
         default_as_of = 0
         as_of_block = st.number_input(
@@ -317,26 +818,27 @@ def render_app() -> None:
         topn = st.slider("Top N tables", min_value=5, max_value=100, value=10)
         whale_threshold = st.number_input("Whale threshold units", min_value=0.0, value=1000.0, step=1.0)
 
-    with closing(connect(cfg)) as con:
-        symbol, decimals = read_metadata(con, contract)
-        latest = pick_latest_block(con, contract)
-
-        effective_as_of = as_of_block
-        if effective_as_of > 0:
-            if latest > 0 and effective_as_of > latest:
-                st.warning(f"As of block {effective_as_of} exceeds DB maximum {latest}. Using {latest}.")
-                effective_as_of = latest
-            if lo_bn > 0 and effective_as_of < lo_bn:
-                st.warning(f"As of block {effective_as_of} is below DB minimum {lo_bn}. Using {lo_bn}.")
-                effective_as_of = lo_bn
-        effective_as_of = 0 if as_of_block == 0 else effective_as_of
-
-        query_asof = latest if effective_as_of == 0 else effective_as_of
-        holders = holders_count(con, contract, query_asof)
-        total = total_supply(con, contract, query_asof)
-        gini_db = gini_from_balances_db(con, contract, query_asof)
-        xfers = transfers_count(con, contract)
-        cr_df = concentration_ratios_db(con, contract, query_asof, ks=(1, 2, 3, 5, 10))
+    latest = hi_bn
+
+    effective_as_of = as_of_block
+    if effective_as_of > 0:
+        if latest > 0 and effective_as_of > latest:
+            st.warning(f"As of block {effective_as_of} exceeds DB maximum {latest}. Using {latest}.")
+            effective_as_of = latest
+        if lo_bn > 0 and effective_as_of < lo_bn:
+            st.warning(f"As of block {effective_as_of} is below DB minimum {lo_bn}. Using {lo_bn}.")
+            effective_as_of = lo_bn
+    effective_as_of = 0 if as_of_block == 0 else effective_as_of
+
+    query_asof = int(latest if effective_as_of == 0 else effective_as_of)
+    # hi_bn is the contract's last balances block, so this is _serves_latest without a query
+    use_latest = bool(hi_bn) and query_asof >= hi_bn and cached_latest_fresh(db_path, stamp)
+    metrics = cached_metrics(db_path, stamp, contract, query_asof, use_latest)
+    holders = metrics["holders"]
+    total = metrics["total"]
+    gini_db = metrics["gini"]
+    xfers = metrics["transfers"]
+    cr_df = metrics["cr"]
 
     c1, c2, c3, c4, c5, c6 = st.columns(6)
     c1.metric("Symbol", symbol)
@@ -353,54 +855,63 @@ def render_app() -> None:
     if hi_bn:
         st.markdown(_latest_badge_html(0 if effective_as_of == 0 else int(effective_as_of), hi_bn), unsafe_allow_html=True)
 
-    with closing(connect(cfg)) as con:
-        top_df = top_holders(con, contract, query_asof, topn)
-    st.subheader("Top Holders")
-    if top_df.empty:
-        st.info("No holders at the selected as of block.")
-    else:
-        st.bar_chart(top_df.set_index("address_short")["balance_units"])
-        st.dataframe(top_df[["address", "balance_units"]], use_container_width=True)
-
-    with closing(connect(cfg)) as con:
-        whales_df = whales(con, contract, query_asof, whale_threshold, topn)
-    st.subheader(f"Whales ≥ {int(whale_threshold)}")
-    if whales_df.empty:
-        st.info("No whales at the selected threshold and as of block.")
-    else:
-        st.bar_chart(whales_df.set_index("address_short")["balance_units"])
-        c1t, c2t = st.columns(2)
-        c1t.dataframe(whales_df[["address", "balance_units"]], use_container_width=True)
-        c2t.dataframe(whales_df[["address", "balance_units"]], use_container_width=True)
-
-    st.subheader("Concentration Ratios")
-    st.line_chart(cr_df.set_index("k")["ratio"])
-    st.dataframe(cr_df.assign(ratio_pct=cr_df["ratio_pct"].round(2)), use_container_width=True)
-
-    with closing(connect(cfg)) as con:
-        deltas_df = holder_deltas(con, contract, int(start_block_excl), int(end_block_incl))
-    st.subheader("Holder Deltas")
-    if start_block_excl <= 0 and end_block_incl <= 0:
-        st.info("Set a valid window to see deltas.")
-    elif deltas_df.empty:
-        st.info("No holder deltas in the selected window.")
-    else:
-        st.dataframe(deltas_df, use_container_width=True)
+    with _lazy_section("Top Holders", "top_holders_open") as show:
+        if show:
+            top_df = cached_top_holders(db_path, stamp, contract, query_asof, topn, use_latest)
+            if top_df.empty:
+                st.info("No holders at the selected as of block.")
+            else:
+                st.bar_chart(top_df.set_index("address_short")["balance_units"])
+                st.dataframe(top_df[["address", "balance_units"]], use_container_width=True)
+
+    with _lazy_section(f"Whales ≥ {int(whale_threshold)}", "whales_open") as show:
+        if show:
+            whales_df = cached_whales(db_path, stamp, contract, query_asof, whale_threshold, topn, use_latest)
+            if whales_df.empty:
+                st.info("No whales at the selected threshold and as of block.")
+            else:
+                st.bar_chart(whales_df.set_index("address_short")["balance_units"])
+                st.dataframe(whales_df[["address", "balance_units"]], use_container_width=True)
+
+    with _lazy_section("Concentration Ratios", "cr_open") as show:
+        if show:
+            st.line_chart(cr_df.set_index("k")["ratio"])
+            st.dataframe(cr_df.assign(ratio_pct=cr_df["ratio_pct"].round(2)), use_container_width=True)
+
+    with _lazy_section("Holder Deltas", "deltas_open") as show:
+        if show:
+            if start_block_excl <= 0 and end_block_incl <= 0:
+                st.info("Set a valid window to see deltas.")
+            else:
+                deltas_df = cached_holder_deltas(db_path, stamp, contract, int(start_block_excl), int(end_block_incl))
+                if deltas_df.empty:
+                    st.info("No holder deltas in the selected window.")
+                else:
+                    st.dataframe(deltas_df, use_container_width=True)
 
     st.divider()
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
-        now = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        prefix = f"oni_snapshot_{symbol or 'token'}_{now}"
-        for name, df_out in [
-            ("top_holders.csv", top_df),
-            ("whales.csv", whales_df),
-            ("concentration_ratios.csv", cr_df),
-            ("holder_deltas.csv", deltas_df),
-        ]:
-            if isinstance(df_out, pd.DataFrame) and not df_out.empty:
-                z.writestr(f"{prefix}/{name}", df_out.to_csv(index=False))
-    st.download_button("Download snapshot zip", data=buf.getvalue(), file_name="snapshot.zip", mime="application/zip")
+    now = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+
+    def build_snapshot() -> bytes:
+        # the frames come from the same caches the sections read, so open sections cost nothing twice
+        return snapshot_zip(
+            f"oni_snapshot_{symbol or 'token'}_{now}",
+            [
+                ("top_holders.csv", cached_top_holders(db_path, stamp, contract, query_asof, topn, use_latest)),
+                ("whales.csv", cached_whales(
+                    db_path, stamp, contract, query_asof, whale_threshold, topn, use_latest)),
+                ("concentration_ratios.csv", cr_df),
+                ("holder_deltas.csv", cached_holder_deltas(
+                    db_path, stamp, contract, int(start_block_excl), int(end_block_incl))),
+            ],
+        ).getvalue()
+
+    st.download_button(
+        "Download snapshot zip",
+        data=build_snapshot if _DEFERRED_DOWNLOADS else build_snapshot(),
+        file_name="snapshot.zip",
+        mime="application/zip",
+    )
 
 
 # import safety for tests and ci
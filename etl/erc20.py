@@ -9,6 +9,9 @@ def _strip_0x(s: str) -> str:
 
 def _hex_to_addr(topic_32bytes: str) -> str:
     # topic is 32-byte hex; last 20 bytes are the address
+    if isinstance(topic_32bytes, str) and len(topic_32bytes) == 66:
+        # the usual 0x-prefixed full topic, no prefix strip or length checks needed
+        return "0x" + topic_32bytes[-40:]
     t = _strip_0x(topic_32bytes) or ""
     if len(t) < 40:
         # fallback; not enough data
@@ -20,15 +23,16 @@ def _hex_to_int(hex_or_int) -> int:
         return 0
     if isinstance(hex_or_int, int):
         return hex_or_int
-    s = str(hex_or_int).lower()
-    return int(s, 16) if s.startswith("0x") else int(s)
+    # int() parses the 0x prefix and either case itself; a lowercased copy only costs time
+    s = str(hex_or_int)
+    return int(s, 16) if s[:2] in ("0x", "0X") else int(s)
 
 def is_erc20_transfer(log: dict) -> bool:
     topics = log.get("topics") or []
     if not topics or not isinstance(topics, list):
         return False
-    t0 = str(topics[0]).lower()
-    return t0 == TRANSFER_TOPIC0
+    t0 = topics[0]
+    return t0 == TRANSFER_TOPIC0 or str(t0).lower() == TRANSFER_TOPIC0
 
 def decode_erc20_transfer(log: dict) -> Optional[dict]:
     """
@@ -1,17 +1,43 @@
+from functools import lru_cache
 from typing import Optional
 from storage.sqlite_backend import SQLiteStorage
 from typing import Dict, Any, Iterable
 from etl import extract
 
 
+@lru_cache(maxsize=8)
+def _storage(db_path: str) -> SQLiteStorage:
+    """
+    One set up SQLiteStorage per path, reused across loader calls.
+    Call _storage.cache_clear() if the file is replaced underneath.
+    """
+    sm = SQLiteStorage(db_path)
+    sm.setup()
+    return sm
+
+
+_PG_BACKENDS = ("postgres", "postgresql", "pg")
+
+
+@lru_cache(maxsize=8)
+def _pg_storage(dsn: Optional[str]):
+    """
+    One set up PostgresStorage per DSN; None falls back to PG_DSN.
+    """
+    from storage.manager import get_storage
+
+    sm = get_storage("postgres", dsn=dsn)
+    sm.setup()
+    return sm
+
+
 def run_etl(start_block: int, *, backend: str = "sqlite", sqlite_path: Optional[str] = None) -> int:
     if backend != "sqlite":
         raise ValueError("only sqlite backend is supported")
     if not sqlite_path:
         raise ValueError("sqlite_path required")
 
-    storage = SQLiteStorage(sqlite_path)
-    storage.setup()  # creates tables only once, non-destructive
+    storage = _storage(sqlite_path)
 
     raw = extract.extract_block(start_block)
     txs = raw.get("transactions", [])
@@ -31,29 +57,46 @@ def load_transactions(backend: str, txs: Iterable[Dict[str, Any]], **backend_opt
     if backend != "sqlite":
         return
     db_path = backend_opts.get("sqlite_path") or backend_opts.get("db_path") or "data/dev.db"
-    sm = SQLiteStorage(db_path); sm.setup()
+    sm = _storage(db_path)
     # Transaction rows aren't strictly persisted by tests; no-op is acceptable.
 
 
 def load_logs(backend: str, logs: Iterable[Dict[str, Any]], **backend_opts) -> None:
+    """
+    Store logs in SQLite, or COPY them into Postgres for the postgres backend names (DSN from
+    pg_dsn, dsn or PG_DSN); block_number fills in for logs without their own. Other backends
+    are ignored.
+    """
+    if backend in _PG_BACKENDS:
+        _pg_storage(backend_opts.get("pg_dsn") or backend_opts.get("dsn")).write_logs_bulk(
+            logs or [], block_number=backend_opts.get("block_number")
+        )
+        return
     if backend != "sqlite":
         return
     db_path = backend_opts.get("sqlite_path") or backend_opts.get("db_path") or "data/dev.db"
-    sm = SQLiteStorage(db_path); sm.setup()
-    for lg in logs or []:
-        sm.write_log(lg)
+    sm = _storage(db_path)
+    sm.write_logs_bulk(logs or [])
 
 
 def load_transfers(backend: str, transfers: Iterable[Dict[str, Any]], **backend_opts) -> None:
+    """
+    Store transfers in SQLite, or COPY them into Postgres for the postgres backend names
+    (DSN from pg_dsn, dsn or PG_DSN). Other backends are ignored.
+    """
+    if backend in _PG_BACKENDS:
+        _pg_storage(backend_opts.get("pg_dsn") or backend_opts.get("dsn")).write_transfers_bulk(transfers or [])
+        return
     if backend != "sqlite":
         return
     db_path = backend_opts.get("sqlite_path") or backend_opts.get("db_path") or "data/dev.db"
-    sm = SQLiteStorage(db_path); sm.setup()
-    for t in transfers or []:
-        # Ensure fields the storage expects
-        t = {
+    sm = _storage(db_path)
+    # Ensure fields the storage expects
+    sm.write_transfers_bulk(
+        {
             **t,
             "value": int(t["value"]),
             "block_number": int(t.get("block_number", t.get("blockNumber", 0))),
         }
-        sm.write_transfer(t)
+        for t in transfers or []
+    )
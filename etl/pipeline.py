@@ -1,7 +1,11 @@
 # etl/pipeline.py
 from __future__ import annotations
 
-from typing import Dict, Any, List, Optional, Tuple
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 # Keep the existing imports in case other code paths use them
 from etl import extract, load
@@ -40,10 +44,16 @@ def _topic_to_address(topic_hex: str) -> str:
     return "0x" + addr_hex
 
 
+_TRANSFER_SIG = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
 def _is_erc20_transfer(log: Dict[str, Any]) -> bool:
-    sig = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
-    topics = [str(t).lower() for t in (log.get("topics") or [])]
-    return bool(topics) and topics[0] == sig
+    topics = log.get("topics")
+    if not topics:
+        return False
+    # only topic0 matters; RPC topics are already lowercase, so lower() is the fallback
+    t0 = topics[0]
+    return t0 == _TRANSFER_SIG or str(t0).lower() == _TRANSFER_SIG
 
 
 def _sqlite_persist_block(
@@ -57,23 +67,53 @@ def _sqlite_persist_block(
     Writes transactions and logs into the sqlite schema used by tests.
     Also derives transfers from ERC20 logs.
     """
-    # transactions
-    for tx in txs:
-        store.write_transaction(tx)
-
-    # logs plus derived transfers
-    for lg in logs:
-        store.write_log(lg)
-        if _is_erc20_transfer(lg):
-            tr = {
-                "tx_hash": lg.get("transactionHash"),
-                "contract": lg.get("address"),
-                "sender": _topic_to_address(lg["topics"][1]) if len(lg.get("topics", [])) > 1 else "",
-                "recipient": _topic_to_address(lg["topics"][2]) if len(lg.get("topics", [])) > 2 else "",
-                "value": _hex_to_int(lg.get("data")),
-                "block_number": _hex_to_int(lg.get("blockNumber", bn)),
-            }
-            store.write_transfer(tr)
+    # one batched insert per table rather than a commit per row
+    store.write_transactions_bulk(txs)
+    store.write_logs_bulk(logs)
+
+    # transfers derived from the ERC20 logs
+    store.write_transfers_bulk(
+        {
+            "tx_hash": lg.get("transactionHash"),
+            "contract": lg.get("address"),
+            "sender": _topic_to_address(lg["topics"][1]) if len(lg.get("topics", [])) > 1 else "",
+            "recipient": _topic_to_address(lg["topics"][2]) if len(lg.get("topics", [])) > 2 else "",
+            "value": _hex_to_int(lg.get("data")),
+            "block_number": _hex_to_int(lg.get("blockNumber", bn)),
+        }
+        for lg in logs
+        if _is_erc20_transfer(lg)
+    )
+
+
+# blocks extracted ahead of the one being written, so RPC waits overlap the SQLite writes
+_PREFETCH_BLOCKS = 2
+
+
+def _extract_workers() -> int:
+    # ETL_EXTRACT_WORKERS > 1 fetches blocks concurrently; RPC_RPS still caps the total rate
+    try:
+        return max(1, int(os.environ.get("ETL_EXTRACT_WORKERS") or 1))
+    except ValueError:
+        return 1
+
+
+def _prefetched_blocks(start_block: int, end_block: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    (block number, raw block) for the inclusive window, in order. Background threads run
+    extract_block ahead of the block being written while the caller, the only writer, persists.
+    """
+    workers = _extract_workers()
+    blocks = iter(range(start_block, end_block + 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="etl-extract") as pool:
+        ahead = max(_PREFETCH_BLOCKS, workers + 1)
+        pending = deque((bn, pool.submit(extract.extract_block, bn)) for bn in islice(blocks, ahead))
+        while pending:
+            bn, fut = pending.popleft()
+            nxt = next(blocks, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(extract.extract_block, nxt)))
+            yield bn, fut.result() or {}
 
 
 def _safe_call_loader(fn, backend: str, payload, **kwargs) -> None:
@@ -105,14 +145,13 @@ def run_etl(
     # Fast path for sqlite used by the tests
     store: Optional[SQLiteStorage] = None
     if backend == "sqlite" and sqlite_path:
-        store = SQLiteStorage(sqlite_path)
-        store.setup()
+        # shared with the loaders, so repeated runs over one file reuse its connection and setup
+        store = load._storage(sqlite_path)
 
     load_opts = dict(sqlite_path=sqlite_path)
     load_opts.update(opts)
 
-    for bn in range(s, e + 1):
-        raw = extract.extract_block(bn) or {}
+    for bn, raw in _prefetched_blocks(s, e):
         txs: List[Dict[str, Any]] = list(raw.get("transactions") or [])
         logs: List[Dict[str, Any]] = list(raw.get("logs") or [])
 
@@ -125,4 +164,9 @@ def run_etl(
         total_tx += len(txs)
         total_logs += len(logs)
 
+    if store is not None:
+        # the dashboard's indexes and latest balance table follow the file at the end of each run
+        store.index_dashboard_tables()
+        store.rebuild_balances_latest()
+
     return total_tx + total_logs
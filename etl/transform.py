@@ -1,4 +1,4 @@
-from etl.erc20 import is_erc20_transfer, decode_erc20_transfer
+from etl.erc20 import decode_erc20_transfer
 
 
 def _coerce_int(value, default=0) -> int:
@@ -51,10 +51,6 @@ def transform_logs(raw_logs: list[dict]) -> list[dict]:
 
 
 def decode_erc20_transfers(raw_logs: list[dict]) -> list[dict]:
-    transfers = []
-    for lg in raw_logs or []:
-        if is_erc20_transfer(lg):
-            rec = decode_erc20_transfer(lg)
-            if rec:
-                transfers.append(rec)
-    return transfers
+    # decode_erc20_transfer checks topic0 itself and returns None for other logs,
+    # so each log is matched once rather than twice
+    return [rec for rec in map(decode_erc20_transfer, raw_logs or []) if rec]
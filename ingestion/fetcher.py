@@ -2,8 +2,11 @@
 from __future__ import annotations
 
 import os
+import threading
+import time
+from functools import lru_cache
 import requests
-from typing import Any, List, Optional, Callable, Dict
+from typing import Any, List, Optional, Callable, Dict, Tuple
 
 from common.settings import load_settings, Settings
 from ingestion.checkpoint import Checkpoint
@@ -29,12 +32,58 @@ def get_settings() -> Settings:
     return _settings
 
 
+class _TokenBucket:
+    """
+    Thread safe token bucket: up to rate requests per second on average, bursts of one
+    second's worth. Callers on several threads share the budget instead of each sleeping
+    a fixed gap.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@lru_cache(maxsize=4)
+def _bucket(rps: float) -> _TokenBucket:
+    return _TokenBucket(rps)
+
+
+def _throttle(calls: int = 1) -> None:
+    # RPC_RPS read at call time like RPC_URL; unset or invalid means no limit.
+    # Providers meter each call inside a batch, so a batch takes one token per call
+    try:
+        rps = float(os.environ.get("RPC_RPS") or 0)
+    except ValueError:
+        rps = 0.0
+    if rps > 0:
+        bucket = _bucket(rps)
+        for _ in range(calls):
+            bucket.acquire()
+
+
 def _rpc_post(method: str, params: List[Any], timeout: float = 30.0, url: Optional[str] = None):
     """
     Return the JSON RPC result field directly.
     """
     u = url or rpc_url()
     payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    _throttle()
     try:
         resp = requests.post(u, json=payload, timeout=timeout)
         resp.raise_for_status()
@@ -46,6 +95,45 @@ def _rpc_post(method: str, params: List[Any], timeout: float = 30.0, url: Option
         raise RuntimeError(f"RPC transport failed for {method} url={u}") from e
 
 
+# JSON RPC calls sent per POST by _rpc_post_batch callers
+_RPC_BATCH_SIZE = 10
+
+
+def _rpc_post_batch(calls: List[Tuple[str, List[Any]]], timeout: float = 30.0, url: Optional[str] = None) -> List[Any]:
+    """
+    Several JSON RPC calls in one POST, results returned in call order.
+    Replies in a batch may arrive in any order, so they are matched back on id.
+    """
+    u = url or rpc_url()
+    payload = [{"jsonrpc": "2.0", "id": i, "method": m, "params": p} for i, (m, p) in enumerate(calls)]
+    _throttle(len(calls))
+    try:
+        resp = requests.post(u, json=payload, timeout=timeout)
+        resp.raise_for_status()
+        data = resp.json()
+    except requests.RequestException as e:
+        raise RuntimeError(f"RPC transport failed for a batch of {len(calls)} url={u}") from e
+    if not isinstance(data, list):
+        # a provider rejecting the batch as a whole answers with a single error object
+        raise RuntimeError(f"RPC batch rejected url={u} err={data.get('error') if isinstance(data, dict) else data}")
+    by_id = {d.get("id"): d for d in data if isinstance(d, dict)}
+    out = []
+    for i, (method, _) in enumerate(calls):
+        d = by_id.get(i)
+        if d is None or "error" in d:
+            raise RuntimeError(f"RPC error for {method} url={u} err={d and d.get('error')}")
+        out.append(d["result"])
+    return out
+
+
+def _logs_chunk() -> int:
+    # ETH_LOGS_CHUNK blocks per eth_getLogs call; unset keeps one call for the whole range
+    try:
+        return max(0, int(os.environ.get("ETH_LOGS_CHUNK") or 0))
+    except ValueError:
+        return 0
+
+
 def fetch_block(block_number: int):
     if not isinstance(block_number, int) or block_number < 0:
         raise ValueError("block_number must be a non negative integer")
@@ -67,12 +155,26 @@ def fetch_logs(address: str, from_block: int, to_block: int) -> List[dict]:
         raise ValueError("from_block and to_block must be integers")
     if from_block < 0 or to_block < from_block:
         raise ValueError("invalid block range")
-    params = [{"address": address, "fromBlock": hex(from_block), "toBlock": hex(to_block)}]
-    # _rpc_post already returns the result list
-    result = _rpc_post("eth_getLogs", params)
-    if not isinstance(result, list):
-        raise RuntimeError("RPC response for eth_getLogs did not return a list")
-    return result
+    chunk = _logs_chunk()
+    if not chunk or to_block - from_block < chunk:
+        params = [{"address": address, "fromBlock": hex(from_block), "toBlock": hex(to_block)}]
+        # _rpc_post already returns the result list
+        result = _rpc_post("eth_getLogs", params)
+        if not isinstance(result, list):
+            raise RuntimeError("RPC response for eth_getLogs did not return a list")
+        return result
+    # one eth_getLogs per chunk, _RPC_BATCH_SIZE of them per POST
+    calls = [
+        ("eth_getLogs", [{"address": address, "fromBlock": hex(lo), "toBlock": hex(min(lo + chunk - 1, to_block))}])
+        for lo in range(from_block, to_block + 1, chunk)
+    ]
+    out: List[dict] = []
+    for i in range(0, len(calls), _RPC_BATCH_SIZE):
+        for result in _rpc_post_batch(calls[i:i + _RPC_BATCH_SIZE]):
+            if not isinstance(result, list):
+                raise RuntimeError("RPC response for eth_getLogs did not return a list")
+            out.extend(result)
+    return out
 
 
 def _get_storage():
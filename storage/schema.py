@@ -38,15 +38,17 @@ CREATE TABLE IF NOT EXISTS transfers (
 """
 
 
+# Current balances computed from transfers, so the view is never stale. Each side is grouped
+# on its own before the union, on the (contract, ...) covering index SQLiteStorage creates.
 BALANCES_VIEW_SQL = """
 CREATE VIEW IF NOT EXISTS balances_view AS
 SELECT contract,
        address,
        SUM(amt) AS balance
 FROM (
-    SELECT contract, "to"   AS address, value    AS amt FROM transfers
+    SELECT contract, recipient AS address, SUM(value)  AS amt FROM transfers GROUP BY contract, recipient
     UNION ALL
-    SELECT contract, "from" AS address, -value   AS amt FROM transfers
+    SELECT contract, sender    AS address, -SUM(value) AS amt FROM transfers GROUP BY contract, sender
 )
 GROUP BY contract, address;
 """
@@ -61,36 +63,34 @@ def ensure_analytics_views(con):
     cur = con.cursor()
 
     # View: transfers_enriched
-    #   Flattens each transfer into +/- deltas for from/to addresses.
+    #   Flattens each transfer into +/- deltas for recipient/sender addresses.
     cur.execute("""
     CREATE VIEW IF NOT EXISTS transfers_enriched AS
     SELECT
         contract,
-        "to"      AS address,
-        value     AS delta,
-        blockNumber
+        recipient     AS address,
+        value         AS delta,
+        block_number  AS blockNumber
     FROM transfers
     UNION ALL
     SELECT
         contract,
-        "from"    AS address,
-        -value    AS delta,
-        blockNumber
+        sender        AS address,
+        -value        AS delta,
+        block_number  AS blockNumber
     FROM transfers;
     """)
 
     # View: mint_burn (optional metadata helper; zero-address mints/burns)
+    #   The zero address has no letters, so plain equality matches it without lower() per row.
     cur.execute("""
     CREATE VIEW IF NOT EXISTS mint_burn AS
-    WITH zero AS (
-        SELECT lower('0x0000000000000000000000000000000000000000') AS z
-    )
     SELECT
-        t.contract,
-        SUM(CASE WHEN lower(t."from") = z THEN t.value ELSE 0 END) AS total_minted,
-        SUM(CASE WHEN lower(t."to")   = z THEN t.value ELSE 0 END) AS total_burned
-    FROM transfers t, zero
-    GROUP BY t.contract;
+        contract,
+        TOTAL(value) FILTER (WHERE sender    = '0x0000000000000000000000000000000000000000') AS total_minted,
+        TOTAL(value) FILTER (WHERE recipient = '0x0000000000000000000000000000000000000000') AS total_burned
+    FROM transfers
+    GROUP BY contract;
     """)
 
     con.commit()
@@ -1,18 +1,189 @@
 # storage/sqlite_backend.py
 from __future__ import annotations
 
+import os
 import sqlite3
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
+
+from common.utils import SQLITE_STATEMENT_CACHE
+
+# per connection settings; journal_mode=WAL is stored in the file and set in setup(),
+# where NORMAL sync is still crash safe and mmap spares read() calls on the aggregations
+_CONN_PRAGMAS = """
+PRAGMA synchronous=NORMAL;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+PRAGMA temp_store=MEMORY;
+"""
+
+# opt in for backfills that can be replayed from their start block: commits skip fsync
+# entirely, so a power loss may drop the last transactions but WAL keeps the file intact
+_FAST_ENV = "ETL_SQLITE_FAST"
+
+# PRAGMA user_version once transfer values were migrated where representable: every TEXT value
+# that fits int64 is INTEGER, larger ones stay TEXT (see _migrate_transfer_values)
+_TRANSFER_VALUES_VERSION = 1
+
+
+def _parse_int(v: Any) -> int:
+    """
+    Hex strings like 0x10 or decimal inputs as int, None as 0.
+    """
+    if isinstance(v, str) and v.startswith("0x"):
+        return int(v, 16)
+    return int(v or 0)
+
+def _transaction_row(tx: Dict[str, Any]) -> tuple:
+    """
+    (tx_hash, from_address, to_address, value) with value as a base 10 string so tests
+    can do int(value). Accepts hex like 0x10 or decimal inputs.
+    """
+    v = tx.get("value")
+    if v is None:
+        value_str = None
+    elif isinstance(v, str) and v.startswith("0x"):
+        value_str = str(int(v, 16))
+    else:
+        value_str = str(int(v))
+    return (
+        tx.get("hash") or tx.get("tx_hash"),
+        tx.get("from") or tx.get("from_address"),
+        tx.get("to") or tx.get("to_address"),
+        value_str,
+    )
+
+
+def _log_row(log: Dict[str, Any]) -> tuple:
+    return (
+        log.get("transactionHash") or log.get("tx_hash"),
+        log.get("address"),
+        log.get("data"),
+        ",".join(log.get("topics") or []),
+    )
+
+
+def _transfer_row(tr: Dict[str, Any]) -> tuple:
+    return (
+        tr.get("tx_hash") or tr.get("transactionHash"),
+        tr.get("contract") or tr.get("address"),
+        tr.get("sender") or tr.get("from") or tr.get("src"),
+        tr.get("recipient") or tr.get("to") or tr.get("dst"),
+        _parse_int(tr.get("value")),
+        _parse_int(tr.get("block_number") or tr.get("blockNumber")),
+    )
+
+
+_INSERT_TRANSACTION = (
+    "INSERT OR REPLACE INTO transactions(tx_hash, from_address, to_address, value) VALUES(?,?,?,?)"
+)
+_INSERT_LOG = "INSERT INTO logs(tx_hash, address, data, topics) VALUES(?,?,?,?)"
+_INSERT_TRANSFER = (
+    "INSERT INTO transfers(tx_hash, contract, sender, recipient, value, block_number) VALUES(?,?,?,?,?,?)"
+)
+# contracts registry, one row per lowercased contract with the earliest block it was seen at,
+# filled from transfers as they are written and from the dashboard's balances on each rebuild
+_CONTRACTS = """
+CREATE TABLE IF NOT EXISTS contracts(
+  contract         TEXT PRIMARY KEY,
+  first_seen_block INTEGER NOT NULL
+)
+"""
+_UPSERT_CONTRACT = (
+    "INSERT INTO contracts(contract, first_seen_block) VALUES(?,?)"
+    " ON CONFLICT(contract) DO UPDATE SET first_seen_block = MIN(first_seen_block, excluded.first_seen_block)"
+)
+_REGISTER_BALANCES_CONTRACTS = (
+    "INSERT INTO contracts(contract, first_seen_block)"
+    " SELECT LOWER(contract), MIN(block_number) FROM balances"
+    " WHERE contract IS NOT NULL AND block_number IS NOT NULL GROUP BY LOWER(contract)"
+    " ON CONFLICT(contract) DO UPDATE SET first_seen_block = MIN(first_seen_block, excluded.first_seen_block)"
+)
+
+# per address latest balance of the dashboard's balances table (contract, address, block_number,
+# balance_units), i.e. the answer of its as-of GROUP BY at the latest block; rebuilt after ingest.
+# balances_latest_built records the balances generation the build saw, so readers can tell a
+# current build from one that later writes have overtaken with one lookup
+_BALANCES_LATEST = """
+CREATE TABLE IF NOT EXISTS balances_latest(
+  contract      TEXT NOT NULL COLLATE NOCASE,
+  address       TEXT NOT NULL,
+  balance_units REAL,
+  block_number  INTEGER,
+  PRIMARY KEY (contract, address)
+);
+CREATE INDEX IF NOT EXISTS idx_balances_latest_contract_balance
+  ON balances_latest(contract, balance_units DESC);
+DROP TABLE IF EXISTS balances_latest_stamp;
+CREATE TABLE IF NOT EXISTS balances_latest_built(
+  generation INTEGER NOT NULL
+);
+"""
+_BALANCES_COLUMNS = {"contract", "address", "block_number", "balance_units"}
+
+# covering indexes for the dashboard's reads of its balances and transfers tables, which match
+# contracts with COLLATE NOCASE -> (table, columns it needs, DDL). The plain column indexes the
+# dashboard used to create itself are dropped
+_DASHBOARD_INDEXES = (
+    ("balances", _BALANCES_COLUMNS, (
+        "DROP INDEX IF EXISTS idx_balances_contract_block_cover",
+        "CREATE INDEX IF NOT EXISTS idx_balances_contract_nocase_cover"
+        " ON balances(contract COLLATE NOCASE, block_number, address, balance_units)",
+    )),
+    ("transfers", {"contract", "block_number", "src", "dst", "amount_units"}, (
+        "DROP INDEX IF EXISTS idx_transfers_contract_block_amounts",
+        "CREATE INDEX IF NOT EXISTS idx_transfers_contract_nocase_amounts"
+        " ON transfers(contract COLLATE NOCASE, block_number, src, dst, amount_units)",
+    )),
+)
+
+# per table change counters bumped by triggers, so readers of a derived table can tell whether
+# its source changed with one row lookup instead of rescanning the source
+_TABLE_GENERATIONS = (
+    "CREATE TABLE IF NOT EXISTS table_generations(name TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+)
+
+
+def _generation_ddl(table: str, events: Iterable[str]) -> List[str]:
+    """DDL counting the given row events on table in table_generations."""
+    ddl = [_TABLE_GENERATIONS, f"INSERT OR IGNORE INTO table_generations(name, generation) VALUES('{table}', 0)"]
+    for event in events:
+        ddl.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_generation_{event.lower()} AFTER {event} ON {table}"
+            f" BEGIN UPDATE table_generations SET generation = generation + 1 WHERE name = '{table}'; END"
+        )
+    return ddl
+
+
+def _first_seen(rows: Iterable[tuple]) -> List[tuple]:
+    """(contract, first block) per lowercased contract of a batch of transfer rows."""
+    first: Dict[str, int] = {}
+    for r in rows:
+        c = r[1].lower()
+        first[c] = min(first.get(c, r[5]), r[5])
+    return list(first.items())
 
 
 class SQLiteStorage:
     def __init__(self, path: str):
         self.path = path
-        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
         self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(_CONN_PRAGMAS)
+        if os.getenv(_FAST_ENV) == "1":
+            self.conn.execute("PRAGMA synchronous=OFF")
+        self._setup_done = False
 
     def setup(self) -> None:
+        """
+        Create the schema and run the one time migrations; later calls on the same
+        instance return at once.
+        """
+        if self._setup_done:
+            return
         cur = self.conn.cursor()
+        has_registry = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contracts'"
+        ).fetchone()
         cur.executescript(
             """
             PRAGMA journal_mode=WAL;
@@ -48,10 +219,107 @@ class SQLiteStorage:
 
             CREATE INDEX IF NOT EXISTS idx_transfers_tx    ON transfers(tx_hash);
             CREATE INDEX IF NOT EXISTS idx_transfers_block ON transfers(block_number);
+            -- one covering index serves both UNION ALL arms of the balance aggregations and
+            -- the balances_current refresh; it replaces the earlier per-arm pair
+            DROP INDEX IF EXISTS idx_transfers_contract_sender;
+            DROP INDEX IF EXISTS idx_transfers_contract_recipient;
+            CREATE INDEX IF NOT EXISTS idx_transfers_contract_block_cover
+              ON transfers(contract, block_number, sender, recipient, value);
+
             """
         )
+        cur.execute(_CONTRACTS)
+        if not has_registry:
+            # files written before the registry existed get it filled from their transfers once
+            cur.execute(
+                "INSERT INTO contracts(contract, first_seen_block)"
+                " SELECT LOWER(contract), MIN(block_number) FROM transfers GROUP BY LOWER(contract)"
+            )
+        # appends are found by rowid; deletes and rewrites bump the generation
+        for ddl in _generation_ddl("transfers", ("DELETE", "UPDATE")):
+            cur.execute(ddl)
+        self.conn.commit()
+        self._migrate_transfer_values()
+        self._analyze_transfers_once()
+        self._setup_done = True
+
+    def _migrate_transfer_values(self) -> None:
+        """
+        Rewrite transfer values stored as TEXT by older writers to INTEGER so SUM(value)
+        runs on native integers. Tracked with PRAGMA user_version so it runs once per DB.
+        The version means migrated where representable: values past int64 cannot be
+        INTEGER and stay TEXT, and later runs do not rescan for them.
+        """
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= _TRANSFER_VALUES_VERSION:
+            return
+        rows = self.conn.execute("SELECT rowid, value FROM transfers WHERE typeof(value) = 'text'").fetchall()
+        updates = [(v, rowid) for rowid, v in ((r[0], _parse_int(r[1])) for r in rows) if -(2**63) <= v < 2**63]
+        with self.conn:
+            self.conn.executemany("UPDATE transfers SET value = ? WHERE rowid = ?", updates)
+            self.conn.execute(f"PRAGMA user_version = {_TRANSFER_VALUES_VERSION}")
+
+    def _analyze_transfers_once(self) -> None:
+        """
+        Gather planner stats for transfers the first time it holds rows so the
+        covering indexes are chosen. Later runs keep the existing stats.
+        """
+        has_stats = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone() and self.conn.execute(
+            "SELECT 1 FROM sqlite_stat1 WHERE tbl = 'transfers' LIMIT 1"
+        ).fetchone()
+        if has_stats:
+            return
+        if self.conn.execute("SELECT 1 FROM transfers LIMIT 1").fetchone() is None:
+            return
+        self.conn.execute("ANALYZE transfers")
         self.conn.commit()
 
+    def index_dashboard_tables(self) -> None:
+        """
+        Create the dashboard's covering indexes on whichever of its tables this file holds.
+        """
+        for table, cols, script in _DASHBOARD_INDEXES:
+            present = {r[1] for r in self.conn.execute(f"PRAGMA table_info({table})")}
+            if not cols <= present:
+                continue
+            with self.conn:
+                for ddl in script:
+                    self.conn.execute(ddl)
+
+    def rebuild_balances_latest(self) -> bool:
+        """
+        Recompute balances_latest from balances when balances changed since the last build,
+        and register the balances contracts in contracts. Every balances write bumps its generation through triggers installed here, whoever
+        the writer is. Files without a balances table are left alone; returns whether a
+        rebuild ran.
+        """
+        present = {r[1] for r in self.conn.execute("PRAGMA table_info(balances)")}
+        if not _BALANCES_COLUMNS <= present:
+            return False
+        self.conn.executescript(_BALANCES_LATEST)
+        self.conn.execute(_CONTRACTS)
+        with self.conn:
+            for ddl in _generation_ddl("balances", ("INSERT", "UPDATE", "DELETE")):
+                self.conn.execute(ddl)
+            generation = self.conn.execute(
+                "SELECT generation FROM table_generations WHERE name = 'balances'"
+            ).fetchone()[0]
+            built = self.conn.execute("SELECT generation FROM balances_latest_built").fetchone()
+            if built is not None and built[0] == generation:
+                return False
+            self.conn.execute("DELETE FROM balances_latest")
+            self.conn.execute(
+                "INSERT INTO balances_latest(contract, address, balance_units, block_number)"
+                " SELECT LOWER(contract), address, MAX(balance_units), MAX(block_number) FROM balances"
+                " WHERE contract IS NOT NULL AND address IS NOT NULL"
+                " GROUP BY LOWER(contract), address"
+            )
+            self.conn.execute(_REGISTER_BALANCES_CONTRACTS)
+            self.conn.execute("DELETE FROM balances_latest_built")
+            self.conn.execute("INSERT INTO balances_latest_built(generation) VALUES(?)", (generation,))
+        return True
+
     def write_block(self, block: Dict[str, Any]) -> None:
         bn = int(block.get("block_number", 0))
         bh = str(block.get("block_hash", ""))
@@ -63,67 +331,39 @@ class SQLiteStorage:
         self.conn.commit()
 
     def write_transaction(self, tx: Dict[str, Any]) -> None:
-        """
-        Normalize value to a base 10 string so tests can do int(value).
-        Accepts hex like 0x10 or decimal inputs.
-        """
-        tx_hash = tx.get("hash") or tx.get("tx_hash")
-        from_addr = tx.get("from") or tx.get("from_address")
-        to_addr = tx.get("to") or tx.get("to_address")
-
-        v = tx.get("value")
-        if v is None:
-            value_str = None
-        else:
-            if isinstance(v, str) and v.startswith("0x"):
-                value_str = str(int(v, 16))
-            else:
-                value_str = str(int(v))
-
-        self.conn.execute(
-            "INSERT OR REPLACE INTO transactions(tx_hash, from_address, to_address, value) VALUES(?,?,?,?)",
-            (tx_hash, from_addr, to_addr, value_str),
-        )
+        self.conn.execute(_INSERT_TRANSACTION, _transaction_row(tx))
         self.conn.commit()
 
     def write_log(self, log: Dict[str, Any]) -> None:
-        self.conn.execute(
-            "INSERT INTO logs(tx_hash, address, data, topics) VALUES(?,?,?,?)",
-            (
-                log.get("transactionHash") or log.get("tx_hash"),
-                log.get("address"),
-                log.get("data"),
-                ",".join(log.get("topics") or []),
-            ),
-        )
+        self.conn.execute(_INSERT_LOG, _log_row(log))
         self.conn.commit()
 
     def write_transfer(self, tr: Dict[str, Any]) -> None:
-        tx_hash = tr.get("tx_hash") or tr.get("transactionHash")
-        contract = tr.get("contract") or tr.get("address")
-        sender = tr.get("sender") or tr.get("from") or tr.get("src")
-        recipient = tr.get("recipient") or tr.get("to") or tr.get("dst")
-
-        val = tr.get("value")
-        if isinstance(val, str) and val.startswith("0x"):
-            value = int(val, 16)
-        else:
-            value = int(val or 0)
-
-        bn = tr.get("block_number") or tr.get("blockNumber")
-        if isinstance(bn, str) and bn.startswith("0x"):
-            block_number = int(bn, 16)
-        else:
-            block_number = int(bn or 0)
+        row = _transfer_row(tr)
+        with self.conn:
+            self.conn.execute(_INSERT_TRANSFER, row)
+            self.conn.executemany(_UPSERT_CONTRACT, _first_seen([row]))
 
-        self.conn.execute(
-            """
-            INSERT INTO transfers(tx_hash, contract, sender, recipient, value, block_number)
-            VALUES(?,?,?,?,?,?)
-            """,
-            (tx_hash, contract, sender, recipient, value, block_number),
-        )
-        self.conn.commit()
+    def _write_bulk(self, sql: str, rows: Iterable[tuple]) -> int:
+        # one transaction and one prepared statement for the batch instead of a commit per row
+        with self.conn:
+            return self.conn.executemany(sql, rows).rowcount
+
+    def write_transactions_bulk(self, txs: Iterable[Dict[str, Any]]) -> int:
+        """write_transaction for many rows in a single transaction; returns the rows written."""
+        return self._write_bulk(_INSERT_TRANSACTION, map(_transaction_row, txs))
+
+    def write_logs_bulk(self, logs: Iterable[Dict[str, Any]]) -> int:
+        """write_log for many rows in a single transaction; returns the rows written."""
+        return self._write_bulk(_INSERT_LOG, map(_log_row, logs))
+
+    def write_transfers_bulk(self, transfers: Iterable[Dict[str, Any]]) -> int:
+        """write_transfer for many rows in a single transaction; returns the rows written."""
+        rows = [_transfer_row(tr) for tr in transfers]
+        with self.conn:
+            n = self.conn.executemany(_INSERT_TRANSFER, rows).rowcount
+            self.conn.executemany(_UPSERT_CONTRACT, _first_seen(rows))
+        return n
 
     def read_block(self, block_number: int) -> Optional[Dict[str, Any]]:
         row = self.conn.execute(
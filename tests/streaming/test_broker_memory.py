@@ -52,3 +52,19 @@ async def test_resume_from_committed_offset():
     await asyncio.wait_for(reader(), timeout=1.0)
     # should resume at offset 3 and 4
     assert got == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_idle_subscriber_wakes_on_publish():
+    b = MemoryBroker()
+    topic = "blocks"
+
+    async def first():
+        async for m in b.subscribe(topic, "g3"):
+            return m.value["i"]
+
+    reader = asyncio.create_task(first())
+    await asyncio.sleep(0.05)  # subscriber is parked on the condition
+    assert not reader.done()
+    await b.publish(topic, "k0", {"i": 0})
+    assert await asyncio.wait_for(reader, timeout=1.0) == 0
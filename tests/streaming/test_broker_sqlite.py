@@ -70,3 +70,54 @@ async def test_sqlite_resume_from_committed_offset(tmp_path):
     b2 = SQLiteBroker(str(db))
     off = await b2.get_offset(topic, group)
     assert off == 4
+
+
+@pytest.mark.asyncio
+async def test_sqlite_offsets_continue_on_pre_sequence_db(tmp_path):
+    import sqlite3
+    db = tmp_path / "legacy_broker.db"
+    b = SQLiteBroker(str(db))
+    assert [await b.publish("blocks", f"k{i}", {"i": i}) for i in range(2)] == [0, 1]
+
+    # simulate a broker file written before topic_seq existed
+    con = sqlite3.connect(str(db))
+    con.execute("DROP TABLE topic_seq")
+    con.commit()
+    con.close()
+
+    b2 = SQLiteBroker(str(db))
+    assert await b2.publish("blocks", "k2", {"i": 2}) == 2
+    assert await b2.publish("txs", "t0", {"i": 0}) == 0
+
+    # a topic missing from a partly seeded topic_seq is seeded on its own
+    con = sqlite3.connect(str(db))
+    con.execute("DELETE FROM topic_seq WHERE topic = 'blocks'")
+    con.commit()
+    con.close()
+
+    b3 = SQLiteBroker(str(db))
+    assert await b3.publish("blocks", "k3", {"i": 3}) == 3
+    assert await b3.publish("txs", "t1", {"i": 1}) == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_durable_keeps_full_sync(tmp_path):
+    db = tmp_path / "broker.db"
+    fast = SQLiteBroker(str(db))
+    durable = SQLiteBroker(str(db), durable=True)
+    # 1 == NORMAL, 2 == FULL
+    assert fast._conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert durable._conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+    assert await durable.publish("blocks", "k0", {"i": 0}) == 0
+    assert await fast.publish("blocks", "k1", {"i": 1}) == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_roundtrips_wide_int_payloads(tmp_path):
+    db = tmp_path / "broker.db"
+    b = SQLiteBroker(str(db))
+    value = {"amount": 10**30, "ok": True}
+    await b.publish("transfers", "t0", value)
+    it = b.subscribe("transfers", "g")
+    msg = await asyncio.wait_for(it.__anext__(), timeout=1.0)
+    assert msg.value == value
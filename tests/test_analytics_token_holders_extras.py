@@ -61,3 +61,166 @@ def test_distribution_metrics(tmp_path):
     # sanity: hhi in (0,1], gini in [0,1]
     assert 0 < m["hhi"] <= 1
     assert 0 <= m["gini"] <= 1
+
+def test_distribution_metrics_sql_matches_python(tmp_path, monkeypatch):
+    import analytics.holders as holders
+    db = tmp_path / "dm.db"
+    sm = SQLiteStorage(str(db)); _seed(sm)
+    # balances A=400, B=60, C=40 -> gini 0.48, hhi 0.6608
+    m_sql = distribution_metrics_sqlite(str(db), CONTRACT)
+    monkeypatch.setattr(holders, "_HAS_WINDOW_FUNCTIONS", False)
+    m_py = distribution_metrics_sqlite(str(db), CONTRACT)
+    for m in (m_sql, m_py):
+        assert abs(m["gini"] - 0.48) < 1e-9
+        assert abs(m["hhi"] - 0.6608) < 1e-9
+        assert m["n_holders"] == 3.0
+        assert m["total"] == 500.0
+        assert m["max"] == 400.0
+        assert m["cr10"] == 1.0
+        assert m["last_block"] == 12
+
+def test_distribution_metrics_large_balances_skip_zero_address(tmp_path):
+    zero = "0x" + "0" * 40
+    db = tmp_path / "big.db"
+    sm = SQLiteStorage(str(db)); sm.setup()
+    sm.write_transfers_bulk([
+        {"tx_hash": "0x1", "contract": CONTRACT, "from": zero, "to": "0xA", "value": 6 * 10**18, "blockNumber": 1},
+        {"tx_hash": "0x2", "contract": CONTRACT, "from": zero, "to": "0xB", "value": 6 * 10**18, "blockNumber": 2},
+        # a transfer into the zero address leaves it with a positive sum; it is still no holder
+        {"tx_hash": "0x3", "contract": CONTRACT, "from": "0xC", "to": zero, "value": 5, "blockNumber": 3},
+    ])
+    sm.write_transfer({"tx_hash": "0x4", "contract": CONTRACT, "from": "0xD", "to": zero, "value": 10**13, "blockNumber": 4})
+    # two holders past half of int64: SUM(bal) would overflow
+    m = distribution_metrics_sqlite(str(db), CONTRACT)
+    assert m["n_holders"] == 2.0
+    assert m["total"] == float(12 * 10**18)
+    assert m["max"] == float(6 * 10**18)
+    assert abs(m["gini"]) < 1e-9 and abs(m["hhi"] - 0.5) < 1e-9 and m["cr10"] == 1.0
+
+def test_gini_hhi_kernels_agree():
+    from analytics.token_holders import _gini_hhi, _gini_hhi_numpy
+    vals = [400, 60, 40, 0, -5]
+    for g, h in (_gini_hhi(vals), _gini_hhi_numpy(vals)):
+        assert abs(g - 0.48) < 1e-9
+        assert abs(h - 0.6608) < 1e-9
+    assert _gini_hhi([]) == (0.0, 0.0)
+
+def test_holder_balances_current_incremental(tmp_path):
+    db = tmp_path / "cur.db"
+    sm = SQLiteStorage(str(db)); _seed(sm)
+    holder_balances_sqlite(str(db), CONTRACT)
+    sm.write_transfer({
+        "tx_hash": "0x4", "contract": CONTRACT,
+        "from": "0xC", "to": "0xD", "value": 15, "blockNumber": 13
+    })
+    by = {x["address"]: x["balance"] for x in holder_balances_sqlite(str(db), CONTRACT)}
+    assert by["0xC"] == 25
+    assert by["0xD"] == 15
+    assert by["0xA"] == 400
+    last = sm.conn.execute(
+        "SELECT last_block FROM balances_current WHERE address = '0xD'"
+    ).fetchone()[0]
+    assert last == 13
+    # nothing new to fold: a read only connection is enough
+    import sqlite3
+    ro = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    assert {x["address"]: x["balance"] for x in holder_balances_sqlite(ro, CONTRACT, n=10)} == by
+
+def test_holder_balances_current_rebuilt_after_delete(tmp_path):
+    db = tmp_path / "del.db"
+    sm = SQLiteStorage(str(db)); _seed(sm)
+    assert {x["address"] for x in holder_balances_sqlite(str(db), CONTRACT)} >= {"0xA", "0xB", "0xC"}
+    # rows below the watermark go away and one is appended: rowid alone would miss the delete
+    with sm.conn:
+        sm.conn.execute("DELETE FROM transfers WHERE tx_hash = '0x3'")
+    sm.write_transfer({"tx_hash": "0x4", "contract": CONTRACT, "from": "0xA", "to": "0xD", "value": 5, "blockNumber": 13})
+    by = {x["address"]: x["balance"] for x in holder_balances_sqlite(str(db), CONTRACT)}
+    assert (by["0xA"], by["0xB"], by["0xD"]) == (395, 100, 5)
+    assert "0xC" not in by
+    # an in place rewrite keeps count and rowids
+    with sm.conn:
+        sm.conn.execute("UPDATE transfers SET value = 7 WHERE tx_hash = '0x4'")
+    by = {x["address"]: x["balance"] for x in holder_balances_sqlite(str(db), CONTRACT)}
+    assert (by["0xA"], by["0xD"]) == (393, 7)
+
+def test_holder_balances_fallback_keeps_filters(tmp_path):
+    from analytics.token_holders import holder_balances_columnar
+    db = tmp_path / "fb.db"
+    sm = SQLiteStorage(str(db)); _seed(sm)
+    zero = "0x" + "0" * 40
+    sm.write_transfer({"tx_hash": "0x4", "contract": CONTRACT, "from": "0xX", "to": zero, "value": 1000, "blockNumber": 13})
+    # an unknown contract falls back to every contract, with the same filters
+    addrs, bals = holder_balances_columnar(str(db), "0xNope", min_balance=50, exclude_burn=True)
+    assert list(zip(addrs.tolist(), bals.tolist())) == [("0xA", 400), ("0xB", 60)]
+    # filters that drop every holder of a known contract are no miss
+    assert not len(holder_balances_columnar(str(db), CONTRACT, min_balance=10**6)[0])
+
+def test_holder_balances_legacy_column_names(tmp_path):
+    import sqlite3
+    from analytics.token_holders import balances_as_of_sqlite
+    db = tmp_path / "legacy.db"
+    con = sqlite3.connect(str(db))
+    con.execute('CREATE TABLE transfers(contract TEXT, "from" TEXT, "to" TEXT, value TEXT, blockNumber INTEGER)')
+    con.executemany(
+        "INSERT INTO transfers VALUES(?,?,?,?,?)",
+        [(CONTRACT, "0x0", "0xA", "500", 10), (CONTRACT, "0xA", "0xB", "100", 11)],
+    )
+    con.commit()
+    by = {x["address"]: x["balance"] for x in holder_balances_sqlite(con, CONTRACT)}
+    assert by["0xA"] == 400 and by["0xB"] == 100
+    by = {x["address"]: x["balance"] for x in balances_as_of_sqlite(con, CONTRACT, as_of_block=10)}
+    assert by == {"0xA": 500, "0x0": -500}
+
+def test_holder_balances_columnar_matches_dicts(tmp_path):
+    from analytics.token_holders import holder_balances_columnar
+    db = tmp_path / "cols.db"
+    sm = SQLiteStorage(str(db)); _seed(sm)
+    addrs, bals = holder_balances_columnar(str(db), CONTRACT)
+    assert bals.dtype.kind == "i"
+    assert list(zip(addrs.tolist(), bals.tolist())) == [
+        (x["address"], x["balance"]) for x in holder_balances_sqlite(str(db), CONTRACT)
+    ]
+
+def test_holder_balances_as_dataframe(tmp_path):
+    import pytest
+    pytest.importorskip("pandas")
+    db = tmp_path / "df.db"
+    sm = SQLiteStorage(str(db)); _seed(sm)
+    df = holder_balances_sqlite(str(db), CONTRACT, as_dataframe=True)
+    assert list(df.columns) == ["address", "balance"]
+    assert df["balance"].tolist() == [x["balance"] for x in holder_balances_sqlite(str(db), CONTRACT)]
+
+def test_analyze_contract_matches_separate_calls(tmp_path):
+    from analytics.holders import analyze_contract
+    db = tmp_path / "an.db"
+    sm = SQLiteStorage(str(db)); _seed(sm)
+    r = analyze_contract(str(db), CONTRACT, window=(10, 12), n=2)
+    assert r["balances"] == holder_balances_sqlite(str(db), CONTRACT)[:2]
+    assert r["gainers"] == top_gainers_sqlite(str(db), CONTRACT, 2, 10, 12)
+    assert r["spenders"] == top_spenders_sqlite(str(db), CONTRACT, 2, 10, 12)
+    m = distribution_metrics_sqlite(str(db), CONTRACT)
+    for k in ("gini", "hhi", "n_holders", "total", "cr10", "last_block"):
+        assert abs(r["metrics"][k] - m[k]) < 1e-9
+
+
+def test_cache_schema_and_source_set_up_once_per_connection(tmp_path):
+    import sqlite3
+    from analytics.token_holders import balances_as_of_sqlite
+    db = tmp_path / "once.db"
+    _seed(SQLiteStorage(str(db)))
+    con = sqlite3.connect(str(db))
+    seen = []
+    con.set_trace_callback(seen.append)
+    for as_of in (None, None, 12, 12):
+        balances_as_of_sqlite(con, CONTRACT, as_of_block=as_of)
+    assert sum("CREATE TABLE IF NOT EXISTS balances_cache" in s for s in seen) == 1
+    assert sum("PRAGMA table_info(transfers)" in s for s in seen) == 1
+
+def test_get_conn_leaves_the_journal_mode_alone(tmp_path):
+    import sqlite3
+    from analytics.token_holders import get_conn
+    db = str(tmp_path / "j.db")
+    sqlite3.connect(db).execute("CREATE TABLE transfers(contract TEXT)")
+    get_conn(db).execute("SELECT 1")
+    assert sqlite3.connect(db).execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    get_conn.cache_clear()
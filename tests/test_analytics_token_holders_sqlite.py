@@ -59,3 +59,125 @@ def test_top_holders_sqlite(tmp_path):
     assert top2[0]["address"] == "0xA"
     assert top2[0]["balance"] == 400
     assert top2[1]["address"] == "0xB"
+
+    top1 = top_holders_sqlite(str(db), "0xToken", n=1, as_of_block=11)
+    assert [r["address"] for r in top1] == ["0xA"]
+
+def test_balances_as_of_cache_invalidation(tmp_path, monkeypatch):
+    import analytics.token_holders as th
+    monkeypatch.setattr(th, "_SNAPSHOT_EVERY", 1)
+    db = tmp_path / "holders4.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+
+    first = balances_as_of_sqlite(str(db), "0xToken", as_of_block=11)
+    assert sm.conn.execute("SELECT COUNT(*) FROM balances_cache").fetchone()[0] == 3  # zero address, A, B
+    assert balances_as_of_sqlite(str(db), "0xToken", as_of_block=11) == first
+
+    # a late transfer inside the cached window must refresh the snapshot
+    sm.write_transfer({
+        "tx_hash": "0x4", "contract": "0xToken",
+        "from": "0xA", "to": "0xD", "value": 10, "blockNumber": 11
+    })
+    by_addr = {x["address"]: x["balance"] for x in balances_as_of_sqlite(str(db), "0xToken", as_of_block=11)}
+    assert by_addr["0xA"] == 390
+    assert by_addr["0xD"] == 10
+
+def test_balances_as_of_rolls_forward_from_earlier_snapshot(tmp_path, monkeypatch):
+    import analytics.token_holders as th
+    from analytics.token_holders import _balances_sql, get_conn
+    monkeypatch.setattr(th, "_SNAPSHOT_EVERY", 1)
+    db = tmp_path / "holders5.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+
+    def fresh(asof):
+        sql = _balances_sql("contract = :c AND block_number <= :a", "transfers") + " ORDER BY balance DESC"
+        return {a: b for a, b in sm.conn.execute(sql, {"c": "0xToken", "a": asof}).fetchall()}
+
+    def cached(asof):
+        return {x["address"]: x["balance"] for x in balances_as_of_sqlite(str(db), "0xToken", as_of_block=asof)}
+
+    assert cached(11) == fresh(11)
+    assert cached(12) == fresh(12)  # built from the block 11 snapshot
+
+    # backfill below the block 11 snapshot: it must not seed block 13
+    sm.write_transfer({
+        "tx_hash": "0x5", "contract": "0xToken",
+        "from": "0xA", "to": "0xE", "value": 7, "blockNumber": 9
+    })
+    get_conn(str(db)).execute("DELETE FROM cache_meta WHERE as_of_block = 12")
+    assert cached(13) == fresh(13)
+    assert cached(13)["0xE"] == 7
+
+def test_balances_as_of_between_checkpoints(tmp_path, monkeypatch):
+    import analytics.token_holders as th
+    from analytics.token_holders import _balances_sql
+    monkeypatch.setattr(th, "_SNAPSHOT_EVERY", 11)
+    db = tmp_path / "holders7.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+
+    sql = _balances_sql("contract = :c AND block_number <= :a", "transfers")
+    fresh = {a: b for a, b in sm.conn.execute(sql, {"c": "0xToken", "a": 12}).fetchall()}
+    by_addr = {x["address"]: x["balance"] for x in balances_as_of_sqlite(str(db), "0xToken", as_of_block=12)}
+    assert by_addr == fresh
+    # only the block 11 checkpoint is persisted, block 12 is summed on read
+    assert [r[0] for r in sm.conn.execute("SELECT DISTINCT as_of_block FROM cache_meta")] == [11]
+
+def test_iter_holder_balances_streams_rows(tmp_path, monkeypatch):
+    import analytics.token_holders as th
+    db = tmp_path / "holders6.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+    monkeypatch.setattr(th, "_FETCH_CHUNK", 1)  # exercise the chunked array path
+
+    rows = list(th.iter_holder_balances(str(db), "0xToken", min_balance=1))
+    assert rows == [r for r in balances_as_of_sqlite(str(db), "0xToken") if r["balance"] >= 1]
+    gen = th.iter_holder_balances(str(db), "0xToken")
+    assert next(gen)["address"] == "0xA"
+    gen.close()
+
+def test_holder_balances_result_cache(tmp_path):
+    from analytics.token_holders import holder_balances_columnar
+    db = tmp_path / "holders7.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+
+    first = holder_balances_columnar(str(db), "0xToken", as_of_block=12)
+    assert holder_balances_columnar(str(db), "0xToken", as_of_block=12) is first
+    assert not first[1].flags.writeable
+
+    sm.write_transfer({
+        "tx_hash": "0x6", "contract": "0xToken",
+        "from": "0xA", "to": "0xF", "value": 1, "blockNumber": 12
+    })
+    addrs, _ = holder_balances_columnar(str(db), "0xToken", as_of_block=12)
+    assert "0xF" in addrs.tolist()
+
+def test_top_holders_on_checkpoint_skips_sort(tmp_path, monkeypatch):
+    import analytics.token_holders as th
+    monkeypatch.setattr(th, "_SNAPSHOT_EVERY", 1)
+    db = tmp_path / "holders8.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+
+    assert [r["address"] for r in top_holders_sqlite(str(db), "0xToken", n=1, as_of_block=12)] == ["0xA"]
+    source, params = th._balances_source(sm.conn, "0xToken", 12)
+    sql, params = th._select_sql(source, params, n=1)
+    plan = " ".join(str(r[-1]) for r in sm.conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert "idx_balances_cache_balance" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_balances_view_follows_transfers(tmp_path):
+    import sqlite3
+    from storage.schema import BALANCES_VIEW_SQL
+    db = tmp_path / "holders4.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+    con = sqlite3.connect(str(db))
+    con.executescript(BALANCES_VIEW_SQL)
+    sql = "SELECT address, balance FROM balances_view WHERE contract = '0xToken'"
+    assert {a: b for a, b in con.execute(sql) if b > 0} == {"0xA": 400, "0xB": 60, "0xC": 40}
+    sm.write_transfer({"tx_hash": "0x9", "contract": "0xToken", "from": "0xA", "to": "0xC", "value": 10, "blockNumber": 20})
+    assert {a: b for a, b in con.execute(sql) if b > 0} == {"0xA": 390, "0xB": 60, "0xC": 50}
@@ -75,3 +75,73 @@ def test_as_of_block(tmp_path):
     assert abs(cr[2] - 1.0) < 1e-9
     # CR3 = still 1.0 (no third holder with nonzero balance)
     assert abs(cr[3] - 1.0) < 1e-9
+
+def test_concentration_ratios_prefix_sums():
+    from analytics.whales import concentration_ratios
+    cr = concentration_ratios([40, 400, 60], ks=(1, 2, 5))
+    assert cr == {1: 0.8, 2: 0.92, 5: 1.0}
+    assert concentration_ratios([40, 400, 60], ks=(1,), total_supply_raw=1000) == {1: 0.4}
+    assert concentration_ratios([], ks=(1, 10)) == {1: 0.0, 10: 0.0}
+
+def test_find_whales_limit_and_contract_scope(tmp_path):
+    db = tmp_path / "scope.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+    _seed_transfers(sm, contract="0xOther")
+    sm.write_transfer({
+        "tx_hash": "0x9", "contract": "0xOther",
+        "from": "0xA", "to": "0xD", "value": 300, "blockNumber": 13
+    })
+
+    assert [w["address"] for w in find_whales_sqlite(str(db), CONTRACT, min_balance=50)] == ["0xA", "0xB"]
+    assert [w["address"] for w in find_whales_sqlite(str(db), CONTRACT, min_balance=50, limit=1)] == ["0xA"]
+    assert [w["address"] for w in find_whales_sqlite(str(db), "0xOther", min_balance=50)] == ["0xD", "0xA", "0xB"]
+
+def test_burn_sink_excluded_in_sql(tmp_path):
+    db = tmp_path / "burn.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+    # 0xM burns 1000 it never minted here: sink = -500 + 1000 = +500, the largest "holder"
+    sm.write_transfer({
+        "tx_hash": "0x9", "contract": CONTRACT,
+        "from": "0xM", "to": "0x0000000000000000000000000000000000000000", "value": 1000, "blockNumber": 13
+    })
+    cr = concentration_ratios_sqlite(str(db), CONTRACT, ks=(1,))
+    assert abs(cr[1] - 0.8) < 1e-9
+    assert [w["address"] for w in find_whales_sqlite(str(db), CONTRACT, min_balance=1)] == ["0xA", "0xB", "0xC"]
+
+def test_concentration_ratios_sql_matches_python(tmp_path, monkeypatch):
+    import analytics.holders as holders
+    db = tmp_path / "crsql.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+    ks = (1, 2, 3, 10)
+    by_sql = concentration_ratios_sqlite(str(db), CONTRACT, ks=ks, as_of_block=11)
+    monkeypatch.setattr(holders, "_HAS_WINDOW_FUNCTIONS", False)
+    by_py = concentration_ratios_sqlite(str(db), CONTRACT, ks=ks, as_of_block=11)
+    assert by_sql.keys() == by_py.keys()
+    assert all(abs(by_sql[k] - by_py[k]) < 1e-12 for k in ks)
+
+
+def test_find_whales_columnar_matches_dicts(tmp_path):
+    from analytics.whales import find_whales_columnar
+    db = tmp_path / "whales_cols.db"
+    sm = SQLiteStorage(str(db))
+    _seed_transfers(sm)
+
+    addrs, bals = find_whales_columnar(str(db), CONTRACT, min_balance=50)
+    assert bals.dtype.kind == "i"
+    assert list(zip(addrs.tolist(), bals.tolist())) == [("0xA", 400), ("0xB", 60)]
+    assert [(w["address"], w["balance"]) for w in find_whales_sqlite(str(db), CONTRACT, min_balance=50)] == [
+        ("0xA", 400), ("0xB", 60)
+    ]
+
+
+def test_concentration_ratios_partial_sort_matches_full_sort():
+    import numpy as np
+    from analytics.whales import concentration_ratios
+    x = np.random.default_rng(7).integers(1, 10**9, size=5000)
+    prefix = np.cumsum(np.sort(x)[::-1])
+    ks = (0, 1, 3, 10, 5000, 6000)
+    expected = {k: (prefix[min(k, x.size) - 1] / prefix[-1] if k > 0 else 0.0) for k in ks}
+    assert concentration_ratios(x, ks) == expected
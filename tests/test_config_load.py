@@ -14,3 +14,18 @@ def test_config_file_exists_and_has_placeholders():
         return not any(bad in line for bad in forbidden)
 
     assert all(safe(line) for line in text.splitlines()), "config.yaml contains potential secrets or live URLs"
+
+
+def test_load_settings_cached_until_file_changes(tmp_path, monkeypatch):
+    import os
+    from common.settings import load_settings
+    monkeypatch.delenv("RPC_URL_OVERRIDE", raising=False)
+    cfg = tmp_path / "config.yaml"
+    body = "rpc:\n  url: https://a.invalid\ndb: {}\ningestion:\n  start_block: 1\n  end_block: END\ncheckpoint: {}\n"
+    cfg.write_text(body.replace("END", "2"))
+    first = load_settings(str(cfg))
+    assert load_settings(str(cfg)) is first
+
+    # a rewrite inside the same mtime tick still changes the size
+    cfg.write_text(body.replace("END", "30"))
+    assert load_settings(str(cfg)).ingestion.end_block == 30
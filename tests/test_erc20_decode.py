@@ -23,3 +23,24 @@ def test_decode_erc20_transfer_basic():
     assert rec["to"].lower().endswith("2222222222222222222222222222222222222222")
     assert rec["value"] == 1000
     assert rec["blockNumber"] == int("0x10", 16)
+
+
+def test_decode_erc20_transfer_hex_forms():
+    from etl.erc20 import _hex_to_addr, _hex_to_int
+    assert _hex_to_int("0X3E8") == _hex_to_int("0x3e8") == _hex_to_int("1000") == 1000
+    assert _hex_to_addr("0x" + "00" * 12 + "ab" * 20) == "0x" + "ab" * 20
+    assert _hex_to_addr("ab" * 20) == "0x" + "ab" * 20
+    assert _hex_to_addr("0xabc") == "0x" + "abc".rjust(40, "0")
+
+
+def test_decode_erc20_transfers_skips_other_logs():
+    from etl.transform import decode_erc20_transfers
+    transfer = {
+        "address": "0xToken", "transactionHash": "0xTX", "blockNumber": 5,
+        "topics": [TRANSFER_TOPIC0.upper().replace("0X", "0x"), "0x" + "00" * 32, "0x" + "11" * 32],
+        "data": "0x7",
+    }
+    other = {"address": "0xToken", "topics": ["0x" + "ab" * 32], "data": "0x"}
+    short = {**transfer, "topics": transfer["topics"][:2]}
+    recs = decode_erc20_transfers([other, transfer, short])
+    assert [(r["tx_hash"], r["to"], r["value"], r["blockNumber"]) for r in recs] == [("0xTX", "0x" + "11" * 20, 7, 5)]
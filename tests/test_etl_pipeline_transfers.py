@@ -1,4 +1,5 @@
 import os
+import pytest
 from etl.pipeline import run_etl
 from storage.sqlite_backend import SQLiteStorage
 
@@ -30,3 +31,29 @@ def test_pipeline_persists_transfers(tmp_path, monkeypatch):
     assert rows[0][0] == "0xdead"
     assert rows[0][1] == "0xToken"
     assert rows[0][2] == 100
+
+
+def test_pipeline_reuses_storage_per_path(tmp_path, monkeypatch):
+    from etl import load
+    monkeypatch.setattr("etl.extract.extract_block", lambda _: {"transactions": [], "logs": []})
+    db_path = str(tmp_path / "reuse.db")
+    run_etl(1, 3, backend="sqlite", sqlite_path=db_path)
+    store = load._storage(db_path)
+    run_etl(4, 5, backend="sqlite", sqlite_path=db_path)
+    assert load._storage(db_path) is store
+    assert store._setup_done
+
+
+@pytest.mark.parametrize("workers", ["1", "3"])
+def test_pipeline_writes_prefetched_blocks_in_order(tmp_path, monkeypatch, workers):
+    monkeypatch.setenv("ETL_EXTRACT_WORKERS", workers)
+
+    def fake_block(bn):
+        return {"transactions": [{"hash": f"0x{bn:x}", "from": "0xA", "to": "0xB", "value": bn}], "logs": []}
+
+    monkeypatch.setattr("etl.extract.extract_block", fake_block)
+    db_path = str(tmp_path / "ordered.db")
+    assert run_etl(1, 6, backend="sqlite", sqlite_path=db_path) == 6
+    sm = SQLiteStorage(db_path)
+    rows = sm.conn.execute("SELECT value FROM transactions ORDER BY rowid").fetchall()
+    assert [int(r[0]) for r in rows] == [1, 2, 3, 4, 5, 6]
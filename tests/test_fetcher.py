@@ -27,3 +27,24 @@ def test_fetch_block_mocked(monkeypatch):
 
     blk = fetch_block(0)
     assert int(blk["number"], 16) == 0
+
+
+def test_rpc_rps_spaces_requests(monkeypatch):
+    import time
+    import requests
+    from ingestion import fetcher
+
+    class FakeResp:
+        def raise_for_status(self):
+            pass
+        def json(self):
+            return {"jsonrpc": "2.0", "id": 1, "result": {"number": "0x0"}}
+
+    monkeypatch.setattr(requests, "post", lambda url, json, timeout: FakeResp())
+    monkeypatch.setenv("RPC_RPS", "20")
+    fetcher._bucket.cache_clear()
+    t0 = time.monotonic()
+    for _ in range(25):
+        fetcher.fetch_block(0)
+    # a full one second burst of 20, then five more at 20 per second
+    assert time.monotonic() - t0 >= 0.2
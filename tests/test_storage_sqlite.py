@@ -22,3 +22,33 @@ def test_sqlite_query_blocks(tmp_path):
     lst = ss.query_blocks(0, 2)
     assert len(lst) == 3
     assert lst[1]["block_number"] == 1
+
+def test_sqlite_connection_pragmas(tmp_path):
+    ss = SQLiteStorage(str(tmp_path / "pragmas.db"))
+    ss.setup()
+    assert ss.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert ss.conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert ss.conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+    plan = " ".join(r[-1] for r in ss.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT sender, recipient, value FROM transfers"
+        " WHERE contract = ? AND block_number BETWEEN ? AND ?", ("0xt", 1, 2)))
+    assert "COVERING INDEX idx_transfers_contract_block_cover" in plan
+
+def test_fast_env_turns_off_sync(tmp_path, monkeypatch):
+    monkeypatch.setenv("ETL_SQLITE_FAST", "1")
+    ss = SQLiteStorage(str(tmp_path / "fast.db"))
+    ss.setup()
+    assert ss.conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+    assert ss.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_analytics_views_follow_transfers_schema(tmp_path):
+    from storage.schema import ensure_analytics_views
+    ss = SQLiteStorage(str(tmp_path / "views.db"))
+    ss.setup()
+    zero = "0x" + "0" * 40
+    for i, (src, dst, v) in enumerate([(zero, "0xa", 500), ("0xa", "0xb", 100), ("0xb", zero, 40)]):
+        ss.write_transfer({"tx_hash": f"0x{i}", "contract": "0xT", "from": src, "to": dst, "value": v, "blockNumber": i})
+    ensure_analytics_views(ss.conn)
+    assert tuple(ss.conn.execute("SELECT total_minted, total_burned FROM mint_burn").fetchone()) == (500, 40)
+    deltas = ss.conn.execute("SELECT address, SUM(delta) FROM transfers_enriched GROUP BY address").fetchall()
+    assert dict((a, d) for a, d in deltas)["0xa"] == 400
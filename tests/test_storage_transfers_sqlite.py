@@ -23,3 +23,85 @@ def test_sqlite_write_transfer(tmp_path):
     assert rows[0][3] == "0xBBB"
     assert rows[0][4] == 100
     assert rows[0][5] == 16
+
+
+def test_balance_aggregation_uses_covering_indexes(tmp_path):
+    from analytics.holders import _deltas_cte
+    sm = SQLiteStorage(str(tmp_path / "idx.db"))
+    sm.setup()
+    sql = f"""
+      EXPLAIN QUERY PLAN
+      WITH {_deltas_cte("contract = :contract AND block_number <= :asof")}
+      SELECT address, SUM(delta) FROM deltas GROUP BY address
+    """
+    plan = [r[3] for r in sm.conn.execute(sql, {"contract": "0xToken", "asof": 10}).fetchall()]
+    assert sum("COVERING INDEX idx_transfers_contract_block_cover" in p for p in plan) == 2
+
+
+def test_setup_migrates_text_values_once(tmp_path):
+    import sqlite3
+    db = str(tmp_path / "legacy_values.db")
+    SQLiteStorage(db).setup()
+    con = sqlite3.connect(db)
+    con.execute("PRAGMA user_version = 0")
+    con.execute(
+        "INSERT INTO transfers(tx_hash, contract, sender, recipient, value, block_number) "
+        "VALUES('0x1', '0xToken', '0xA', '0xB', '0x64', 1), ('0x2', '0xToken', '0xA', '0xB', ?, 2)",
+        (hex(2**70),),
+    )
+    con.commit()
+    assert con.execute("SELECT typeof(value) FROM transfers").fetchone()[0] == "text"
+
+    sm = SQLiteStorage(db)
+    sm.setup()
+    rows = sm.conn.execute("SELECT typeof(value), value FROM transfers ORDER BY rowid").fetchall()
+    # migrated where representable: the value past int64 stays TEXT under the version marker
+    assert [r[:] for r in rows] == [("integer", 100), ("text", hex(2**70))]
+    assert sm.conn.execute("PRAGMA user_version").fetchone()[0] == 1
+
+
+def test_bulk_writes_match_single_row_writes(tmp_path):
+    rows = [
+        {"tx_hash": "0x1", "contract": "0xToken", "from": "0xA", "to": "0xB", "value": "0x64", "blockNumber": 16},
+        {"tx_hash": "0x2", "contract": "0xToken", "sender": "0xB", "recipient": "0xC", "value": 7, "block_number": 17},
+    ]
+    one, bulk = SQLiteStorage(str(tmp_path / "one.db")), SQLiteStorage(str(tmp_path / "bulk.db"))
+    one.setup()
+    bulk.setup()
+    for r in rows:
+        one.write_transfer(r)
+    assert bulk.write_transfers_bulk(iter(rows)) == 2
+    assert bulk.write_logs_bulk([{"tx_hash": "0x1", "address": "0xToken", "data": "0x", "topics": ["a", "b"]}]) == 1
+    sql = "SELECT tx_hash, contract, sender, recipient, value, block_number FROM transfers ORDER BY rowid"
+    assert [tuple(r) for r in bulk.conn.execute(sql)] == [tuple(r) for r in one.conn.execute(sql)]
+    assert bulk.conn.execute("SELECT topics FROM logs").fetchone()[0] == "a,b"
+    assert not bulk.conn.in_transaction
+
+
+def test_transfer_writes_keep_the_contracts_registry(tmp_path):
+    sm = SQLiteStorage(str(tmp_path / "reg.db"))
+    sm.setup()
+    sm.write_transfer({"tx_hash": "0x1", "contract": "0xTok", "from": "0xA", "to": "0xB", "value": 1, "blockNumber": 9})
+    sm.write_transfers_bulk([
+        {"tx_hash": "0x2", "contract": "0xtok", "from": "0xA", "to": "0xB", "value": 1, "blockNumber": 5},
+        {"tx_hash": "0x3", "contract": "0xOther", "from": "0xA", "to": "0xB", "value": 1, "blockNumber": 12},
+        {"tx_hash": "0x4", "contract": "0xTOK", "from": "0xA", "to": "0xB", "value": 1, "blockNumber": 30},
+    ])
+    sql = "SELECT contract, first_seen_block FROM contracts ORDER BY contract"
+    assert [tuple(r) for r in sm.conn.execute(sql)] == [("0xother", 12), ("0xtok", 5)]
+
+
+def test_setup_fills_the_contracts_registry_from_existing_transfers(tmp_path):
+    import sqlite3
+    db = str(tmp_path / "old.db")
+    SQLiteStorage(db).setup()
+    con = sqlite3.connect(db)
+    con.execute("DROP TABLE contracts")
+    con.execute(
+        "INSERT INTO transfers(tx_hash, contract, sender, recipient, value, block_number) "
+        "VALUES('0x1', '0xTok', '0xA', '0xB', 1, 4), ('0x2', '0xtok', '0xA', '0xB', 1, 2)"
+    )
+    con.commit()
+    sm = SQLiteStorage(db)
+    sm.setup()
+    assert [tuple(r) for r in sm.conn.execute("SELECT * FROM contracts")] == [("0xtok", 2)]
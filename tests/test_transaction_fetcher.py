@@ -8,3 +8,32 @@ def test_fetch_transaction_invalid_input():
 def test_fetch_logs_invalid_range():
     with pytest.raises(ValueError):
         fetch_logs("0xABC", 100, 50)  # from > to
+
+
+def test_fetch_logs_batches_chunked_ranges(monkeypatch):
+    import requests
+    from ingestion import fetcher
+
+    posts = []
+
+    class FakeResp:
+        def __init__(self, payload):
+            self._payload = payload
+        def raise_for_status(self):
+            pass
+        def json(self):
+            # answer out of order, as providers may
+            return [{"jsonrpc": "2.0", "id": c["id"], "result": [c["params"][0]["fromBlock"]]}
+                    for c in reversed(self._payload)]
+
+    def fake_post(url, json, timeout):
+        posts.append(json)
+        return FakeResp(json)
+
+    monkeypatch.setattr(requests, "post", fake_post)
+    monkeypatch.setenv("ETH_LOGS_CHUNK", "10")
+    monkeypatch.setattr(fetcher, "_RPC_BATCH_SIZE", 3)
+    logs = fetch_logs("0xabc", 0, 44)
+    assert logs == [hex(b) for b in range(0, 45, 10)]
+    assert [len(p) for p in posts] == [3, 2]
+    assert posts[1][-1]["params"][0]["toBlock"] == hex(44)